@@ -0,0 +1,378 @@
+import hashlib
+import hmac
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from dates import date_range
+from fast_json import dumps, loads
+from github_client import PR_ACTIONS, commit_item, create_item, pull_request_item
+from jira_client import JiraIssue, JiraWorklog
+from sqlite_store import connect
+from typing import Optional
+
+class ActivityIndex:
+    """
+    Local index of Jira worklogs and GitHub commits and pull requests, fed by
+    webhooks and keyed by (user, date), so reads need no upstream call.
+
+    A user's day is only served from the index once a client fetch has
+    backfilled it (reconcile_jira / reconcile_github) within
+    WEBHOOK_RECONCILE_AFTER seconds; webhooks keep it current in between and
+    the next backfill repairs any delivery that was lost. Rows a webhook
+    delivers while a backfill is running win over the backfill's copy.
+    """
+    def __init__(self, path: Optional[str] = None, reconcile_after: Optional[float] = None):
+        self.path = path or os.getenv("ACTIVITY_INDEX_PATH", "activity_index.db")
+        self.reconcile_after = (
+            reconcile_after if reconcile_after is not None
+            else float(os.getenv("WEBHOOK_RECONCILE_AFTER", str(24 * 3600)))
+        )
+        self.enabled = os.getenv("WEBHOOK_INDEX_ENABLED", "false").lower() == "true"
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jira_worklogs ("
+                "id TEXT PRIMARY KEY, issue_id TEXT NOT NULL, email TEXT, account_id TEXT, "
+                "date TEXT NOT NULL, started TEXT NOT NULL, seconds INTEGER NOT NULL, comment TEXT, "
+                "received_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS jira_worklogs_user ON jira_worklogs (email, date);"
+                "CREATE INDEX IF NOT EXISTS jira_worklogs_account ON jira_worklogs (account_id);"
+                "CREATE TABLE IF NOT EXISTS jira_issues ("
+                "id TEXT PRIMARY KEY, key TEXT NOT NULL, summary TEXT, status TEXT);"
+                "CREATE TABLE IF NOT EXISTS github_items ("
+                "id TEXT PRIMARY KEY, user TEXT NOT NULL, date TEXT NOT NULL, kind INTEGER NOT NULL, "
+                "item TEXT NOT NULL, received_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS github_items_user ON github_items (user, date);"
+                "CREATE TABLE IF NOT EXISTS coverage ("
+                "source TEXT NOT NULL, user TEXT NOT NULL, date TEXT NOT NULL, reconciled_at REAL NOT NULL, "
+                "PRIMARY KEY (source, user, date));"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _covered(self, db: sqlite3.Connection, source: str, user: str, dates: list) -> list:
+        placeholders = ",".join("?" for _ in dates)
+        rows = db.execute(
+            f"SELECT date FROM coverage WHERE source = ? AND user = ? AND reconciled_at >= ? "
+            f"AND date IN ({placeholders})",
+            (source, user, time.time() - self.reconcile_after, *dates)
+        ).fetchall()
+        return sorted(date for date, in rows)
+
+    def jira_days(self, email: str, dates: list) -> dict:
+        """
+        Returns date -> the activity dictionary JiraClient builds for the day,
+        for the covered dates whose issues are all known.
+        """
+        if not dates:
+            return {}
+        with self._lock:
+            db = self._db()
+            covered = self._covered(db, "jira", email, dates)
+            if not covered:
+                return {}
+            placeholders = ",".join("?" for _ in covered)
+            rows = db.execute(
+                f"SELECT w.date, w.issue_id, i.key, i.summary, i.status, w.seconds, w.comment "
+                f"FROM jira_worklogs w LEFT JOIN jira_issues i ON i.id = w.issue_id "
+                f"WHERE w.email = ? AND w.date IN ({placeholders}) ORDER BY w.started, w.id",
+                (email, *covered)
+            ).fetchall()
+
+        days = {
+            date: {"date": date, "developer": email, "issues": [], "total_time_seconds": 0}
+            for date in covered
+        }
+        issues = {}
+        unknown = set()
+        for date, issue_id, key, summary, status, seconds, comment in rows:
+            if key is None:
+                # Waiting for the issue to be looked up; fetch the day instead
+                unknown.add(date)
+                continue
+            issue = issues.get((date, issue_id))
+            if issue is None:
+                issue = issues[(date, issue_id)] = {
+                    "key": key, "summary": summary, "status": status, "time_spent_seconds": 0, "comments": []
+                }
+                days[date]["issues"].append(issue)
+            issue["time_spent_seconds"] += seconds
+            if comment is not None:
+                issue["comments"].append(comment)
+
+        for day in days.values():
+            day["issues"] = [issue for issue in day["issues"] if issue["time_spent_seconds"] > 0]
+            day["total_time_seconds"] = sum(issue["time_spent_seconds"] for issue in day["issues"])
+        return {date: day for date, day in days.items() if date not in unknown}
+
+    def github_days(self, user: str, dates: list) -> dict:
+        """
+        Returns date -> the activity list GitHubClient builds for the day, for
+        the covered dates.
+        """
+        if not dates:
+            return {}
+        with self._lock:
+            db = self._db()
+            covered = self._covered(db, "github", user, dates)
+            if not covered:
+                return {}
+            placeholders = ",".join("?" for _ in covered)
+            rows = db.execute(
+                f"SELECT date, item FROM github_items WHERE user = ? AND date IN ({placeholders}) "
+                f"ORDER BY kind, rowid",
+                (user, *covered)
+            ).fetchall()
+
+        days = {date: [] for date in covered}
+        for date, item in rows:
+            days[date].append(loads(item))
+        return days
+
+    def reconcile_jira(self, email: str, start_date: str, end_date: str, issues: list, fetched_at: float):
+        """
+        Replaces the developer's worklogs in the range with a fetch (JiraIssue
+        records) that started at `fetched_at`, and marks the days covered.
+        """
+        dates = date_range(start_date, end_date)
+        wanted = set(dates)
+        issue_rows = []
+        worklog_rows = []
+        for issue in issues:
+            issue_id = str(issue.id or issue.key)
+            issue_rows.append((issue_id, issue.key, issue.summary, issue.status))
+            for worklog in issue.worklogs:
+                if worklog.email == email and worklog.started[:10] in wanted:
+                    worklog_rows.append(_worklog_row(issue_id, worklog, email, fetched_at))
+
+        placeholders = ",".join("?" for _ in dates)
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"DELETE FROM jira_worklogs WHERE email = ? AND date IN ({placeholders}) AND received_at < ?",
+                (email, *dates, fetched_at)
+            )
+            self._put_issues(db, issue_rows)
+            self._put_worklogs(db, worklog_rows)
+            self._cover(db, "jira", email, dates, fetched_at)
+            db.commit()
+
+    def reconcile_github(self, user: str, days: dict, fetched_at: float):
+        """
+        Replaces the user's items on the given days (date -> activity list)
+        with a fetch that started at `fetched_at`, and marks the days covered.
+        """
+        dates = list(days)
+        rows = [
+            (_github_item_id(user, date, item), user, date, _github_kind(item), dumps(item), fetched_at)
+            for date, items in days.items()
+            for item in items
+        ]
+        placeholders = ",".join("?" for _ in dates)
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"DELETE FROM github_items WHERE user = ? AND date IN ({placeholders}) AND received_at < ?",
+                (user, *dates, fetched_at)
+            )
+            self._put_github_items(db, rows)
+            self._cover(db, "github", user, dates, fetched_at)
+            db.commit()
+
+    def put_jira_issue(self, issue: JiraIssue):
+        """
+        Records an issue's key, summary and status.
+        """
+        with self._lock:
+            db = self._db()
+            self._put_issues(db, [(str(issue.id or issue.key), issue.key, issue.summary, issue.status)])
+            db.commit()
+
+    def ingest_jira(self, payload: dict) -> dict:
+        """
+        Applies a Jira webhook (worklog_created/updated/deleted and
+        jira:issue_created/updated/deleted). Worklog deliveries only carry the
+        issue id; an issue the index has not seen is reported as
+        "unknown_issue" so the caller can look it up.
+        """
+        event = payload.get("webhookEvent", "")
+        now = time.time()
+        result = {"event": event, "applied": 0}
+
+        with self._lock:
+            db = self._db()
+            if event in ("jira:issue_created", "jira:issue_updated"):
+                issue = payload.get("issue") or {}
+                fields = issue.get("fields") or {}
+                if issue.get("id") and issue.get("key"):
+                    self._put_issues(db, [(str(issue["id"]), issue["key"], fields.get("summary"),
+                                           (fields.get("status") or {}).get("name"))])
+                    result["applied"] = 1
+            elif event == "jira:issue_deleted":
+                issue_id = str((payload.get("issue") or {}).get("id"))
+                db.execute("DELETE FROM jira_issues WHERE id = ?", (issue_id,))
+                result["applied"] = db.execute("DELETE FROM jira_worklogs WHERE issue_id = ?", (issue_id,)).rowcount
+            elif event in ("worklog_created", "worklog_updated"):
+                worklog = payload.get("worklog") or {}
+                author = worklog.get("author") or {}
+                email = author.get("emailAddress")
+                if not email and author.get("accountId"):
+                    # Jira hides the address under some privacy settings; reuse one a fetch saw
+                    row = db.execute(
+                        "SELECT email FROM jira_worklogs WHERE account_id = ? AND email IS NOT NULL LIMIT 1",
+                        (author["accountId"],)
+                    ).fetchone()
+                    email = row[0] if row else None
+                if worklog.get("id") and worklog.get("issueId") and worklog.get("started"):
+                    issue_id = str(worklog["issueId"])
+                    self._put_worklogs(db, [_worklog_row(issue_id, JiraWorklog.from_api(worklog), email, now)])
+                    result["applied"] = 1
+                    if email is None:
+                        result["unresolved_author"] = author.get("accountId")
+                    if db.execute("SELECT 1 FROM jira_issues WHERE id = ?", (issue_id,)).fetchone() is None:
+                        result["unknown_issue"] = issue_id
+            elif event == "worklog_deleted":
+                worklog_id = str((payload.get("worklog") or {}).get("id"))
+                result["applied"] = db.execute("DELETE FROM jira_worklogs WHERE id = ?", (worklog_id,)).rowcount
+            db.commit()
+        return result
+
+    def ingest_github(self, event: str, payload: dict) -> dict:
+        """
+        Applies a GitHub webhook: commits pushed to the default branch (what
+        the backfill reads), opened, closed or reopened pull requests, and
+        created branches, tags and repositories. Items are built like the
+        backfill's, so a day reads the same from either.
+        """
+        repository = payload.get("repository") or {}
+        repo = repository.get("full_name")
+        sender = (payload.get("sender") or {}).get("login")
+        now = time.time()
+        rows = []
+
+        if event == "push" and payload.get("ref") == f"refs/heads/{repository.get('default_branch')}":
+            pusher_email = (payload.get("pusher") or {}).get("email")
+            for commit in payload.get("commits") or []:
+                author = commit.get("author") or {}
+                # Commits by someone without a linked account have no username; if the
+                # address is the pusher's, the sender is the author
+                user = author.get("username") or (
+                    sender if pusher_email and author.get("email") == pusher_email else None
+                )
+                date = _utc_date(commit.get("timestamp"))
+                if not user or not date or not commit.get("id"):
+                    continue
+                item = commit_item(repo, commit["id"], commit.get("message", ""))
+                rows.append((_github_item_id(user, date, item), user, date, _github_kind(item), dumps(item), now))
+        elif event == "pull_request" and payload.get("action") in PR_ACTIONS:
+            pull_request = payload.get("pull_request") or {}
+            action = payload["action"]
+            title = pull_request.get("title")
+            date = _utc_date(pull_request.get("updated_at"))
+            if sender and date:
+                item = pull_request_item(repo, action, title, pull_request.get("html_url"))
+                rows.append((_github_item_id(sender, date, item), sender, date, _github_kind(item), dumps(item), now))
+        elif event == "create" or (event == "repository" and payload.get("action") == "created"):
+            # Neither delivery has a timestamp; the feed dates its CreateEvent when it happened, in UTC
+            date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            if event == "create":
+                ref, ref_type = payload.get("ref"), payload.get("ref_type")
+            else:
+                ref, ref_type = None, "repository"
+            if sender and repo:
+                item = create_item(repo, ref, ref_type, date)
+                rows.append((_github_item_id(sender, date, item), sender, date, _github_kind(item), dumps(item), now))
+
+        if rows:
+            with self._lock:
+                db = self._db()
+                self._put_github_items(db, rows)
+                db.commit()
+        return {"event": event, "applied": len(rows)}
+
+    @staticmethod
+    def _put_issues(db: sqlite3.Connection, rows: list):
+        db.executemany(
+            "INSERT OR REPLACE INTO jira_issues (id, key, summary, status) VALUES (?, ?, ?, ?)", rows
+        )
+
+    @staticmethod
+    def _put_worklogs(db: sqlite3.Connection, rows: list):
+        # A backfill row never overwrites one a webhook delivered after the fetch started
+        db.executemany(
+            "INSERT INTO jira_worklogs "
+            "(id, issue_id, email, account_id, date, started, seconds, comment, received_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+            "issue_id = excluded.issue_id, email = COALESCE(excluded.email, jira_worklogs.email), "
+            "account_id = excluded.account_id, date = excluded.date, started = excluded.started, "
+            "seconds = excluded.seconds, comment = excluded.comment, received_at = excluded.received_at "
+            "WHERE excluded.received_at >= jira_worklogs.received_at",
+            rows
+        )
+
+    @staticmethod
+    def _put_github_items(db: sqlite3.Connection, rows: list):
+        db.executemany(
+            "INSERT INTO github_items (id, user, date, kind, item, received_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET user = excluded.user, date = excluded.date, kind = excluded.kind, "
+            "item = excluded.item, received_at = excluded.received_at "
+            "WHERE excluded.received_at >= github_items.received_at",
+            rows
+        )
+
+    @staticmethod
+    def _cover(db: sqlite3.Connection, source: str, user: str, dates: list, reconciled_at: float):
+        db.executemany(
+            "INSERT OR REPLACE INTO coverage (source, user, date, reconciled_at) VALUES (?, ?, ?, ?)",
+            [(source, user, date, reconciled_at) for date in dates]
+        )
+
+def signature_valid(secret: str, body: bytes, header: Optional[str]) -> bool:
+    """
+    Checks an X-Hub-Signature(-256) header ("sha256=<hex HMAC of the body>"),
+    as sent by GitHub and by Jira webhooks that have a secret.
+    """
+    if not header or not header.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, header[len("sha256="):])
+
+def _worklog_row(issue_id: str, worklog: JiraWorklog, email: Optional[str], received_at: float) -> tuple:
+    return (
+        str(worklog.id or f"{issue_id}@{worklog.started}"),
+        issue_id,
+        email,
+        worklog.account_id,
+        worklog.started[:10],
+        worklog.started,
+        worklog.seconds,
+        worklog.comment,
+        received_at
+    )
+
+def _github_item_id(user: str, date: str, item: dict) -> str:
+    # A commit is listed once however many repos (forks) it shows up in
+    if item["type"] == "Commit":
+        return f"commit:{item['key']}"
+    return f"{item['type']}:{user}:{date}:{item.get('action') or ''}:{item.get('key')}"
+
+def _github_kind(item: dict) -> int:
+    # The client lists events before commits
+    return 1 if item["type"] == "Commit" else 0
+
+def _utc_date(timestamp: Optional[str]) -> Optional[str]:
+    # GitHub's REST API reports UTC; webhook timestamps carry the committer's offset
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).astimezone(timezone.utc).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+index = ActivityIndex()
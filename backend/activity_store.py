@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from fast_json import dumps, loads
+from sqlite_store import connect
+from typing import Optional
+
+class ActivityStore:
+    """
+    Local store of upstream activity keyed by (source, user, date).
+    Days older than ACTIVITY_FINAL_AFTER_DAYS are treated as finalised and served
+    straight from disk; recent days keep the ETag (GitHub) and fetch time (Jira)
+    they were built from so the clients can ask upstream only for changes.
+    """
+    def __init__(self, path: Optional[str] = None, final_after_days: Optional[int] = None):
+        self.path = path or os.getenv("ACTIVITY_STORE_PATH", "activity_store.db")
+        self.final_after_days = (
+            final_after_days if final_after_days is not None
+            else int(os.getenv("ACTIVITY_FINAL_AFTER_DAYS", "2"))
+        )
+        self.enabled = os.getenv("ACTIVITY_STORE_ENABLED", "true").lower() == "true"
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS activity ("
+                "source TEXT NOT NULL, user TEXT NOT NULL, date TEXT NOT NULL, "
+                "payload TEXT NOT NULL, fetched_at REAL NOT NULL, etag TEXT, "
+                "PRIMARY KEY (source, user, date))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def is_final(self, date: str) -> bool:
+        cutoff = (datetime.now() - timedelta(days=self.final_after_days)).strftime("%Y-%m-%d")
+        return date < cutoff
+
+    def is_settled(self, date: str, fetched_at: float) -> bool:
+        """
+        True if the date is finalised and was fetched after it became final,
+        so the stored copy can be served without asking upstream.
+        """
+        if not self.is_final(date):
+            return False
+        final_at = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=self.final_after_days)
+        return fetched_at >= final_at.timestamp()
+
+    def get_days(self, source: str, user: str, dates: list) -> dict:
+        """
+        Returns date -> {"payload", "fetched_at", "etag"} for the stored dates.
+        """
+        if not self.enabled or not dates:
+            return {}
+        placeholders = ",".join("?" for _ in dates)
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT date, payload, fetched_at, etag FROM activity "
+                f"WHERE source = ? AND user = ? AND date IN ({placeholders})",
+                (source, user, *dates)
+            ).fetchall()
+        return {
+            date: {"payload": loads(payload), "fetched_at": fetched_at, "etag": etag}
+            for date, payload, fetched_at, etag in rows
+        }
+
+    def put_days(self, source: str, user: str, payloads: dict, etag: Optional[str] = None,
+                 fetched_at: Optional[float] = None):
+        if not self.enabled or not payloads:
+            return
+        fetched_at = fetched_at or time.time()
+        with self._lock:
+            db = self._db()
+            db.executemany(
+                "INSERT OR REPLACE INTO activity (source, user, date, payload, fetched_at, etag) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (source, user, date, dumps(payload), fetched_at, etag)
+                    for date, payload in payloads.items()
+                ]
+            )
+            db.commit()
+
+store = ActivityStore()
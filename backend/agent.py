@@ -1,68 +1,107 @@
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.messages import HumanMessage
+from llm_registry import registry as llm_registry, LLMConfigError
+from llm_cache import cache as llm_cache
+from prompt_builder import pack, dedupe_commits, token_budget
+from singleflight import SingleFlight
+import asyncio
+import json
 import os
 from models import ActivitySummary, TimesheetEntry, IssueDetail
 
-def summarize_activity(jira_data: dict, llm_provider: str = None) -> ActivitySummary:
+# Identical prompts in flight at the same time (a team opening the dashboard
+# together) share one LLM call; keyed like the LLM cache
+_flights = SingleFlight("llm")
+
+async def summarize_activity(jira_data: dict, llm_provider: str = None) -> ActivitySummary:
     """
     Uses LangChain to summarize the daily activity fetched from Jira.
     """
-    llm_provider = (llm_provider or os.getenv("LLM_PROVIDER", "openai")).lower()
-    llm = None
-
-    if llm_provider == "azure":
-        api_key = os.getenv("AZURE_OPENAI_API_KEY")
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
+    llm_provider = llm_registry.resolve_provider(llm_provider)
+    try:
+        llm_registry.route(llm_provider)
+    except LLMConfigError as e:
+        return _mock_summary(jira_data, str(e))
 
-        if not api_key or not endpoint:
-             return _mock_summary(jira_data, "Azure OpenAI credentials not set.")
-        
-        llm = AzureChatOpenAI(
-            api_key=api_key,
-            azure_endpoint=endpoint,
-            azure_deployment=deployment,
-            api_version=api_version,
-            temperature=0.7
-        )
-
-    elif llm_provider == "grok":
-        api_key = os.getenv("GROK_API_KEY")
-        if not api_key:
-             return _mock_summary(jira_data, "Grok API Key not set.")
-        
-        # Grok is compatible with OpenAI's API structure
-        llm = ChatOpenAI(
-            openai_api_key=api_key,
-            openai_api_base="https://api.x.ai/v1",
-            model_name="grok-4-latest",
-            temperature=0.7
-        )
+    # Construct the prompt and details
+    prompt, details, total_hours = _summary_prompt(jira_data)
     
-    elif llm_provider == "openai":
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return _mock_summary(jira_data, "OpenAI API Key not set.")
-        
-        llm = ChatOpenAI(temperature=0.7, model_name="gpt-3.5-turbo", openai_api_key=api_key)
-        
-    else:
-        return _mock_summary(jira_data, f"Unsupported LLM Provider: {llm_provider}")
+    cache_key = _summary_cache_key(llm_provider, prompt)
+    content = await asyncio.to_thread(llm_cache.get, cache_key)
+    cached = content is not None
 
-    # Construct the prompt and details
-    issues_text = ""
+    try:
+        if not cached:
+            async def generate():
+                response = await llm_registry.ainvoke(llm_provider, [HumanMessage(content=prompt)])
+                await asyncio.to_thread(llm_cache.set, cache_key, response.content)
+                return response.content
+
+            content = await _flights.do(cache_key, generate)
+            
+        return _build_summary(jira_data, details, total_hours, content, cached)
+    except Exception as e:
+        return _summary_error(jira_data, llm_provider, e)
+
+async def stream_summary(jira_data: dict, llm_provider: str = None):
+    """
+    Async generator for the streaming summary endpoint. Yields a "details" event
+    with the Jira-derived figures first, then "token" events as the LLM produces
+    text, then a trailing "summary" event with the final ActivitySummary.
+    """
+    llm_provider = llm_registry.resolve_provider(llm_provider)
+    prompt, details, total_hours = _summary_prompt(jira_data)
+
+    yield {
+        "event": "details",
+        "total_hours": total_hours,
+        "issues_worked_on": [i["summary"] for i in jira_data.get("issues", [])],
+        "details": [detail.model_dump() for detail in details]
+    }
+
+    try:
+        llm_registry.route(llm_provider)
+    except LLMConfigError as e:
+        yield {"event": "summary", "summary": _mock_summary(jira_data, str(e)).model_dump()}
+        return
+
+    cache_key = _summary_cache_key(llm_provider, prompt)
+    content = await asyncio.to_thread(llm_cache.get, cache_key)
+    cached = content is not None
+
+    try:
+        if cached:
+            yield {"event": "token", "text": content}
+        else:
+            parts = []
+            async for chunk in llm_registry.astream(llm_provider, [HumanMessage(content=prompt)]):
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield {"event": "token", "text": chunk.content}
+            content = "".join(parts)
+            await asyncio.to_thread(llm_cache.set, cache_key, content)
+
+        summary = _build_summary(jira_data, details, total_hours, content, cached)
+    except Exception as e:
+        summary = _summary_error(jira_data, llm_provider, e)
+    yield {"event": "summary", "summary": summary.model_dump()}
+
+def _summary_prompt(jira_data: dict):
+    """
+    Returns (prompt, details, total_hours) for the standup summary. Each issue's
+    key, status and time is packed into PROMPT_TOKEN_BUDGET_SUMMARY before any
+    comment, so headers are only cut once they alone exceed the budget.
+    """
+    lines = []
     details = []
     
-    for issue in jira_data.get("issues", []):
-        issues_text += f"- {issue['key']}: {issue['summary']} ({issue['status']})\n"
+    for i, issue in enumerate(jira_data.get("issues", [])):
         hours = issue['time_spent_seconds']/3600
-        issues_text += f"  Time: {hours:.2f} hours\n"
+        lines.append((0, i, f"- {issue['key']}: {issue['summary']} ({issue['status']})\n  Time: {hours:.2f} hours"))
         
         comments = issue.get("comments", [])
-        if comments:
-            issues_text += f"  Comments: {', '.join(comments)}\n"
+        for comment in comments:
+            lines.append((1, (i, "comments"), comment))
             
         details.append(IssueDetail(
             key=issue['key'],
@@ -71,6 +110,13 @@ def summarize_activity(jira_data: dict, llm_provider: str = None) -> ActivitySum
             time_spent=round(hours, 2),
             comments=comments
         ))
+
+    sections, _ = pack(lines, token_budget("summary"))
+    issues_text = ""
+    for i in range(len(details)):
+        issues_text += "".join(f"{line}\n" for line in sections.get(i, []))
+        if sections.get((i, "comments")):
+            issues_text += f"  Comments: {', '.join(sections[(i, 'comments')])}\n"
     
     total_hours = jira_data.get("total_time_seconds", 0) / 3600
     
@@ -89,30 +135,33 @@ def summarize_activity(jira_data: dict, llm_provider: str = None) -> ActivitySum
     
     Determine the overall status (e.g., On Track, Blocked, Completed) based on the context.
     """
-    
-    try:
-        response = llm.invoke([HumanMessage(content=prompt)])
-        content = response.content
+    return prompt, details, total_hours
+
+def _summary_cache_key(llm_provider: str, prompt: str) -> str:
+    return llm_cache.make_key("summary", llm_provider, llm_registry.default_model(llm_provider), prompt)
+
+def _build_summary(jira_data: dict, details: list, total_hours: float, content: str, cached: bool) -> ActivitySummary:
+    # Simple extraction for status
+    status = "On Track"
+    if "blocked" in content.lower():
+        status = "Blocked"
         
-        # Simple extraction for status
-        status = "On Track"
-        if "blocked" in content.lower():
-            status = "Blocked"
-            
-        return ActivitySummary(
-            total_hours=total_hours,
-            issues_worked_on=[i["summary"] for i in jira_data.get("issues", [])],
-            details=details,
-            summary=content,
-            status=status
-        )
-    except Exception as e:
-        error_msg = str(e)
-        if "403" in error_msg:
-             return _mock_summary(jira_data, f"Access Denied (403) from {llm_provider}. Check firewall/network settings.")
-        if "credits" in error_msg.lower():
-             return _mock_summary(jira_data, "Insufficient credits. Please check your provider's billing.")
-        return _mock_summary(jira_data, f"LLM Error ({llm_provider}): {error_msg}")
+    return ActivitySummary(
+        total_hours=total_hours,
+        issues_worked_on=[i["summary"] for i in jira_data.get("issues", [])],
+        details=details,
+        summary=content,
+        status=status,
+        cached=cached
+    )
+
+def _summary_error(jira_data: dict, llm_provider: str, error: Exception) -> ActivitySummary:
+    error_msg = str(error)
+    if "403" in error_msg:
+         return _mock_summary(jira_data, f"Access Denied (403) from {llm_provider}. Check firewall/network settings.")
+    if "credits" in error_msg.lower():
+         return _mock_summary(jira_data, "Insufficient credits. Please check your provider's billing.")
+    return _mock_summary(jira_data, f"LLM Error ({llm_provider}): {error_msg}")
 
 def _mock_summary(jira_data: dict, message: str) -> ActivitySummary:
     return ActivitySummary(
@@ -122,75 +171,227 @@ def _mock_summary(jira_data: dict, message: str) -> ActivitySummary:
         status="Unknown"
     )
 
-def generate_timesheet_entry(jira_data: dict, github_data: list, date: str, config: dict, llm_provider: str = None) -> TimesheetEntry:
+async def generate_timesheet_entry(jira_data: dict, github_data: list, date: str, config: dict, llm_provider: str = None) -> TimesheetEntry:
     """
     Generates a single timesheet entry for the day by prioritizing activities
     and using LLM to generate a remark.
     """
-    # 1. Select Best Task
-    selected_jira = None
-    if jira_data.get("issues"):
-        # Prioritize: Done/Completed > In Progress > Others
-        def get_priority(issue):
-            status = issue.get("status", "").lower()
-            if status in ["done", "completed", "verified", "closed", "resolved"]:
-                return 0
-            elif status == "in progress":
-                return 1
+    # 1 & 2. Select Best Task and Prepare Context for LLM
+    selected_jira, jira_context, github_context = _timesheet_context(jira_data, github_data)
+
+    if not jira_context and not github_context:
+        return _no_activity_entry(date, config)
+
+    # 3. Generate Summary via LLM
+    llm_provider = llm_registry.resolve_provider(llm_provider)
+    prompt = _remark_prompt(date, jira_context, github_context)
+
+    cache_key = _remark_cache_key(llm_provider, date, jira_context, github_context)
+    remark = await asyncio.to_thread(llm_cache.get, cache_key)
+    cached = remark is not None
+
+    if not cached:
+        async def generate():
+            response = await llm_registry.ainvoke(llm_provider, [HumanMessage(content=prompt)])
+            remark = response.content.strip()
+            await asyncio.to_thread(llm_cache.set, cache_key, remark)
+            return remark
+
+        try:
+            remark = await _flights.do(cache_key, generate)
+        except Exception as e:
+            remark = _failed_remark(e)
+
+    # 4. Construct Entry
+    return _build_entry(date, selected_jira, github_data, remark, config, cached)
+
+def timesheet_config(request) -> dict:
+    """
+    Per-developer entry settings from a TimesheetRequest or TeamMember.
+    """
+    return {
+        "jira_project_key": request.jira_project_key,
+        "billable": request.billable,
+        "role": request.role,
+        "site": request.site,
+        "authorized_hours": request.authorized_hours
+    }
+
+def timesheet_days(dates: list, jira_by_date: dict, github_by_date: dict) -> list:
+    """
+    Zips per-day Jira and GitHub maps into the `days` list the generators take.
+    """
+    return [
+        {"date": date, "jira_data": jira_by_date.get(date, {}), "github_data": github_by_date.get(date, [])}
+        for date in dates
+    ]
+
+async def generate_timesheet_entries(days: list, config: dict, llm_provider: str = None, batch_size: int = None) -> list:
+    """
+    Generates timesheet entries for several days at once. Each item of `days` is a
+    dict with "date", "jira_data" and "github_data". Entries keep the order of `days`.
+    """
+    entries = [None] * len(days)
+    async for i, entry in iter_timesheet_entries(days, config, llm_provider, batch_size):
+        entries[i] = entry
+    return entries
+
+async def iter_timesheet_entries(days: list, config: dict, llm_provider: str = None, batch_size: int = None,
+                                 llm_limit: asyncio.Semaphore = None):
+    """
+    Yields (index into days, TimesheetEntry) as each entry becomes ready.
+    Remarks already in the cache are reused without an LLM call. The rest are
+    generated `batch_size` days (default LLM_BATCH_SIZE) per JSON-output LLM call,
+    up to LLM_BATCH_CONCURRENCY calls at a time; a batch whose response cannot be
+    parsed falls back to one call per day. A batch identical to one already in
+    flight for another request waits for that call instead. Closing the
+    generator early cancels the LLM calls still running.
+
+    `llm_limit` is held while the LLM calls run and released as soon as they
+    finish, not while the caller consumes the entries.
+    """
+    llm_provider = llm_registry.resolve_provider(llm_provider)
+    batch_size = max(1, batch_size or int(os.getenv("LLM_BATCH_SIZE", "10")))
+    max_concurrency = int(os.getenv("LLM_BATCH_CONCURRENCY", "4"))
+
+    pending = []  # (index, selected_jira, jira_context, github_context)
+    for i, day in enumerate(days):
+        selected_jira, jira_context, github_context = _timesheet_context(day["jira_data"], day["github_data"])
+        if not jira_context and not github_context:
+            yield i, _no_activity_entry(day["date"], config)
+            continue
+
+        cache_key = _remark_cache_key(llm_provider, day["date"], jira_context, github_context)
+        remark = await asyncio.to_thread(llm_cache.get, cache_key)
+        if remark is not None:
+            yield i, _build_entry(day["date"], selected_jira, day["github_data"], remark, config, True)
+        else:
+            pending.append((i, selected_jira, jira_context, github_context))
+
+    if not pending:
+        return
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    limit = asyncio.Semaphore(max_concurrency)
+
+    async def run(batch):
+        items = [(days[i]["date"], jira_context, github_context) for i, _, jira_context, github_context in batch]
+        key = llm_cache.make_key("remarks", llm_provider, None, *(value for item in items for value in item))
+        async with limit:
+            return batch, await _flights.do(key, _generate_remarks, llm_provider, items, max_concurrency)
+
+    if llm_limit is not None:
+        await llm_limit.acquire()
+    tasks = [asyncio.create_task(run(batch)) for batch in batches]
+    if llm_limit is not None:
+        # Also released if the generator is closed, since that cancels the tasks
+        asyncio.gather(*tasks, return_exceptions=True).add_done_callback(lambda _: llm_limit.release())
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            batch, remarks = await next_done
+            for (i, selected_jira, jira_context, github_context), (remark, ok) in zip(batch, remarks):
+                day = days[i]
+                if ok:
+                    cache_key = _remark_cache_key(llm_provider, day["date"], jira_context, github_context)
+                    await asyncio.to_thread(llm_cache.set, cache_key, remark)
+                yield i, _build_entry(day["date"], selected_jira, day["github_data"], remark, config)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _generate_remarks(llm_provider: str, items: list, max_concurrency: int) -> list:
+    """
+    Generates remarks for (date, jira_context, github_context) items with one batch
+    prompt, then per-day prompts for any day the batch response did not cover.
+    Returns a (remark, ok) pair per item.
+    """
+    batch_remarks = {}
+    if len(items) > 1:
+        try:
+            response = await llm_registry.ainvoke(llm_provider, [HumanMessage(content=_batch_remark_prompt(items))])
+            batch_remarks = _parse_batch_remarks(response.content) or {}
+        except Exception:
+            batch_remarks = {}
+
+    results = {date: (batch_remarks[date], True) for date, _, _ in items if batch_remarks.get(date)}
+
+    # Per-day calls for anything the batch did not cover
+    fallback = [item for item in items if item[0] not in results]
+    if fallback:
+        responses = await llm_registry.abatch(llm_provider, [
+            [HumanMessage(content=_remark_prompt(date, jira_context, github_context))]
+            for date, jira_context, github_context in fallback
+        ], max_concurrency=max_concurrency)
+        for (date, _, _), response in zip(fallback, responses):
+            if isinstance(response, Exception):
+                results[date] = (_failed_remark(response), False)
             else:
-                return 2
-        
-        sorted_issues = sorted(jira_data["issues"], key=get_priority)
-        selected_jira = sorted_issues[0]
+                results[date] = (response.content.strip(), True)
 
-    # 2. Prepare Context for LLM
-    jira_context = ""
+    return [results[date] for date, _, _ in items]
+
+def _remark_cache_key(llm_provider: str, date: str, jira_context: str, github_context: str) -> str:
+    # Keyed on the per-day inputs, so batch and single-day generation share entries
+    return llm_cache.make_key(
+        "remark", llm_provider, llm_registry.default_model(llm_provider), date, jira_context, github_context
+    )
+
+def _select_jira_task(jira_data: dict):
+    if not jira_data.get("issues"):
+        return None
+
+    # Prioritize: Done/Completed > In Progress > Others
+    def get_priority(issue):
+        status = issue.get("status", "").lower()
+        if status in ["done", "completed", "verified", "closed", "resolved"]:
+            return 0
+        elif status == "in progress":
+            return 1
+        else:
+            return 2
+
+    sorted_issues = sorted(jira_data["issues"], key=get_priority)
+    return sorted_issues[0]
+
+def _timesheet_context(jira_data: dict, github_data: list):
+    """
+    Returns (selected_jira, jira_context, github_context) for one day, packed into
+    PROMPT_TOKEN_BUDGET_REMARK tokens: the selected task first, then its comments,
+    then PRs, commits (merge commits and near-duplicates removed) and branch creations.
+    """
+    selected_jira = _select_jira_task(jira_data)
+
+    lines = []
     if selected_jira:
-        jira_context = f"Task: {selected_jira['key']} - {selected_jira['summary']}\nStatus: {selected_jira['status']}\n"
-        if selected_jira.get("comments"):
-            jira_context += f"Comments: {'; '.join(selected_jira['comments'])}\n"
-    
+        lines.append((0, "jira", f"Task: {selected_jira['key']} - {selected_jira['summary']}"))
+        lines.append((0, "jira", f"Status: {selected_jira['status']}"))
+        for comment in selected_jira.get("comments", []):
+            lines.append((1, "comments", comment))
+
+    for item in dedupe_commits(github_data or []):
+        if item.get("type") == "PullRequestEvent":
+            lines.append((2, "github", f"- PR {item.get('action')} in {item.get('repo')}: {item.get('summary')}"))
+        elif item.get("type") == "Commit":
+            lines.append((3, "github", f"- Commit in {item.get('repo')}: {item.get('summary')}"))
+        elif item.get("type") == "CreateEvent":
+            lines.append((4, "github", f"- {item.get('description')}"))
+
+    sections, _ = pack(lines, token_budget("remark"))
+
+    jira_context = ""
+    if sections.get("jira"):
+        jira_context = "".join(f"{line}\n" for line in sections["jira"])
+        if sections.get("comments"):
+            jira_context += f"Comments: {'; '.join(sections['comments'])}\n"
+
     github_context = ""
-    if github_data:
-        github_context = "GitHub Activity:\n"
-        for item in github_data[:10]: # Limit to top 10 events to avoid token limits
-            if item.get("type") == "Commit":
-                 github_context += f"- Commit in {item.get('repo')}: {item.get('summary')}\n"
-            elif item.get("type") == "PullRequestEvent":
-                 github_context += f"- PR {item.get('action')} in {item.get('repo')}: {item.get('summary')}\n"
-            elif item.get("type") == "CreateEvent":
-                 github_context += f"- {item.get('description')}\n"
-    
-    if not jira_context and not github_context:
-         return TimesheetEntry(
-            date=date,
-            project="N/A",
-            task="No Activity",
-            task_description="-",
-            status="-",
-            remark="No activity recorded for this day.",
-            hours="0",
-            billable=config.get("billable", "No"),
-            role=config.get("role", "Developer"),
-            site=config.get("site", "Offshore")
-        )
+    if sections.get("github"):
+        github_context = "GitHub Activity:\n" + "".join(f"{line}\n" for line in sections["github"])
 
-    # 3. Generate Summary via LLM
-    llm_provider = (llm_provider or os.getenv("LLM_PROVIDER", "openai")).lower()
-    llm = None
-    
-    if llm_provider == "azure":
-        llm = AzureChatOpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-            azure_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME"),
-            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
-            temperature=0.7
-        )
-    else:
-         llm = ChatOpenAI(temperature=0.7, model_name="gpt-3.5-turbo")
+    return selected_jira, jira_context, github_context
 
-    prompt = f"""
+def _remark_prompt(date: str, jira_context: str, github_context: str) -> str:
+    return f"""
     You are an AI assistant generating a timesheet remark for a software developer.
     
     Date: {date}
@@ -206,15 +407,71 @@ def generate_timesheet_entry(jira_data: dict, github_data: list, date: str, conf
     - If only GitHub activity exists, summarize the development work.
     - Use corporate language (e.g., "Worked on...", "Implemented...", "Fixed...").
     """
-    
-    remark = "Generated summary."
+
+def _batch_remark_prompt(days: list) -> str:
+    """
+    Builds one prompt for several (date, jira_context, github_context) days so
+    the instructions are sent once instead of once per day.
+    """
+    day_sections = "\n".join(
+        f"### Date: {date}\nJira Activity (Priority):\n{jira_context}\nGitHub Activity:\n{github_context}"
+        for date, jira_context, github_context in days
+    )
+    return f"""
+    You are an AI assistant generating timesheet remarks for a software developer.
+
+    For EACH day below, write a professional, concise "Remark" for the timesheet (max 2 sentences).
+    - If Jira activity exists, focus on that task.
+    - If only GitHub activity exists, summarize the development work.
+    - Use corporate language (e.g., "Worked on...", "Implemented...", "Fixed...").
+
+    Respond with JSON only, exactly one remark per listed date, in this form:
+    {{"remarks": [{{"date": "YYYY-MM-DD", "remark": "..."}}]}}
+
+{day_sections}
+    """
+
+def _parse_batch_remarks(content: str):
+    """
+    Parses a batch response into a date -> remark map, or None if it is malformed.
+    """
+    start = content.find("{")
+    end = content.rfind("}")
+    if start == -1 or end < start:
+        return None
     try:
-        response = llm.invoke([HumanMessage(content=prompt)])
-        remark = response.content.strip()
-    except Exception as e:
-        remark = f"Auto-generation failed: {str(e)[:50]}..."
+        data = json.loads(content[start:end + 1])
+    except ValueError:
+        return None
 
-    # 4. Construct Entry
+    items = data.get("remarks") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return None
+
+    remarks = {}
+    for item in items:
+        if isinstance(item, dict) and isinstance(item.get("remark"), str) and item["remark"].strip():
+            remarks[str(item.get("date"))] = item["remark"].strip()
+    return remarks
+
+def _failed_remark(error: Exception) -> str:
+    return f"Auto-generation failed: {str(error)[:50]}..."
+
+def _no_activity_entry(date: str, config: dict) -> TimesheetEntry:
+    return TimesheetEntry(
+        date=date,
+        project="N/A",
+        task="No Activity",
+        task_description="-",
+        status="-",
+        remark="No activity recorded for this day.",
+        hours="0",
+        billable=config.get("billable", "No"),
+        role=config.get("role", "Developer"),
+        site=config.get("site", "Offshore")
+    )
+
+def _build_entry(date: str, selected_jira, github_data: list, remark: str, config: dict, cached: bool = False) -> TimesheetEntry:
     project = config.get("jira_project_key", "PROJ")
     task_summary = "General Development"
     task_desc = "See remarks"
@@ -238,5 +495,6 @@ def generate_timesheet_entry(jira_data: dict, github_data: list, date: str, conf
         hours=config.get("authorized_hours", "8"),
         billable=config.get("billable", "Yes"),
         role=config.get("role", "Developer"),
-        site=config.get("site", "Offshore")
+        site=config.get("site", "Offshore"),
+        cached=cached
     )
@@ -0,0 +1,94 @@
+"""
+Benchmarks ADF text extraction on large synthetic worklog comments.
+
+    python benchmarks/bench_adf.py [--paragraphs 2000] [--repeat 20]
+
+Compares the previous recursive extractor against the iterative one in
+jira_client, with and without a character budget.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jira_client import _extract_text_from_adf, ADF_MAX_CHARS
+
+def recursive_extract(node):
+    # The extractor jira_client used before the iterative rewrite
+    if isinstance(node, dict):
+        if "text" in node:
+            return node["text"]
+        if "content" in node:
+            return " ".join([recursive_extract(child) for child in node["content"]])
+    elif isinstance(node, list):
+         return " ".join([recursive_extract(child) for child in node])
+    return ""
+
+def _text(rng: random.Random, words: int) -> dict:
+    return {"type": "text", "text": " ".join(rng.choice(WORDS) for _ in range(words))}
+
+WORDS = ["fix", "deploy", "review", "refactor", "api", "cache", "query", "timeout", "retry", "index"]
+
+def synthetic_doc(paragraphs: int, seed: int = 7) -> dict:
+    """
+    A worklog comment mixing paragraphs, nested lists, code blocks and tables.
+    """
+    rng = random.Random(seed)
+    content = []
+    for i in range(paragraphs):
+        kind = i % 4
+        if kind == 0:
+            content.append({"type": "paragraph", "content": [
+                _text(rng, 12), {"type": "hardBreak"},
+                {"type": "mention", "attrs": {"id": "42", "text": "@dev"}}, _text(rng, 6),
+                {"type": "inlineCard", "attrs": {"url": f"https://jira.example.com/browse/PROJ-{i}"}}
+            ]})
+        elif kind == 1:
+            nested = {"type": "paragraph", "content": [_text(rng, 4)]}
+            for _ in range(8):
+                nested = {"type": "bulletList", "content": [{"type": "listItem", "content": [nested]}]}
+            content.append(nested)
+        elif kind == 2:
+            code = "\n".join(f"line_{n} = compute({n})" for n in range(40))
+            content.append({"type": "codeBlock", "attrs": {"language": "python"}, "content": [
+                {"type": "text", "text": code}
+            ]})
+        else:
+            content.append({"type": "table", "content": [
+                {"type": "tableRow", "content": [
+                    {"type": "tableCell", "content": [{"type": "paragraph", "content": [_text(rng, 3)]}]}
+                    for _ in range(6)
+                ]}
+                for _ in range(6)
+            ]})
+    return {"type": "doc", "version": 1, "content": content}
+
+def bench(label: str, fn, repeat: int):
+    seconds = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"{label:<32} {seconds * 1000:9.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    doc = synthetic_doc(args.paragraphs)
+    print(f"Synthetic ADF: {args.paragraphs} blocks, {len(_extract_text_from_adf(doc))} chars of text")
+
+    bench("recursive (previous)", lambda: recursive_extract(doc), args.repeat)
+    bench("iterative", lambda: _extract_text_from_adf(doc), args.repeat)
+    bench(f"iterative, max_chars={ADF_MAX_CHARS}", lambda: _extract_text_from_adf(doc, ADF_MAX_CHARS), args.repeat)
+
+    deep = {"type": "text", "text": "leaf"}
+    for _ in range(sys.getrecursionlimit() * 2):
+        deep = {"type": "paragraph", "content": [deep]}
+    try:
+        recursive_extract(deep)
+        print("recursive: deep document ok")
+    except RecursionError:
+        print("recursive: RecursionError on deeply nested document")
+    print(f"iterative: deep document -> {_extract_text_from_adf(deep)!r}")
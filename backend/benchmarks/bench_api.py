@@ -0,0 +1,302 @@
+"""
+End-to-end benchmark of /timesheet/generate and /activity/summary, fully offline.
+
+    python benchmarks/bench_api.py [--endpoint all] [--requests 200] [--concurrency 20]
+        [--days 5] [--issues 10] [--repos 3] [--jira-latency 0.05]
+        [--github-latency 0.05] [--llm-latency 0.3] [--warm] [--no-coalesce]
+
+Jira and GitHub are replayed from synthetic fixtures through an httpx
+MockTransport, and the LLM is a local OpenAI-compatible server, each with the
+given injected latency (seconds). The app is driven in-process over ASGI and
+the report lists throughput, p50/p99 latency and upstream call counts.
+Caches and the activity store are off unless --warm is given; every request
+is identical, so --no-coalesce shows the cost without in-flight coalescing.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import re
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--endpoint", choices=["timesheet", "summary", "all"], default="all")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--issues", type=int, default=10, help="Jira issues per day")
+    parser.add_argument("--repos", type=int, default=3, help="GitHub repos with pushes")
+    parser.add_argument("--jira-latency", type=float, default=0.05)
+    parser.add_argument("--github-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--warm", action="store_true", help="Keep the LLM cache and activity store enabled")
+    parser.add_argument("--no-coalesce", action="store_true", help="Turn off in-flight request coalescing")
+    return parser.parse_args()
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def configure_env(args, workdir: str, llm_port: int):
+    # Must run before the app modules are imported; they read config at import time
+    os.environ.update({
+        "JIRA_URL": "https://jira.bench",
+        "GITHUB_TOKEN": "bench",
+        "LLM_PROVIDER": "openai",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{llm_port}/v1",
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "ACTIVITY_STORE_PATH": os.path.join(workdir, "activity_store.db"),
+        "JOB_STORE_PATH": os.path.join(workdir, "jobs.db"),
+        "UPSTREAM_STATE_PATH": os.path.join(workdir, "upstream_state.db"),
+        "ACTIVITY_INDEX_PATH": os.path.join(workdir, "activity_index.db"),
+        "LLM_CACHE_ENABLED": "true" if args.warm else "false",
+        "ACTIVITY_STORE_ENABLED": "true" if args.warm else "false",
+        "SINGLEFLIGHT_ENABLED": "false" if args.no_coalesce else "true",
+        "BULK_WORKERS": "0",
+        # Measure the app, not the upstream rate limiter
+        "JIRA_RATE_PER_SEC": "100000", "JIRA_RATE_BURST": "100000",
+        "GITHUB_RATE_PER_SEC": "100000", "GITHUB_RATE_BURST": "100000",
+    })
+
+def jira_fixture(dates: list, issues: int, email: str) -> dict:
+    return {
+        "isLast": True,
+        "issues": [
+            {
+                "id": str(10000 + i),
+                "key": f"BENCH-{i}",
+                "fields": {
+                    "summary": f"Synthetic issue {i}",
+                    "status": {"name": ["In Progress", "Done", "To Do"][i % 3]},
+                    "worklog": {
+                        "total": len(dates),
+                        "maxResults": 20,
+                        "worklogs": [
+                            {
+                                "id": str(20000 + i * len(dates) + n),
+                                "author": {"emailAddress": email, "accountId": "bench-dev", "displayName": "Bench Dev"},
+                                "started": f"{date}T09:00:00.000+0000",
+                                "timeSpentSeconds": 1800,
+                                "comment": {"type": "doc", "content": [{"type": "paragraph", "content": [
+                                    {"type": "text", "text": f"Worked on part {n} of issue {i}"}
+                                ]}]}
+                            }
+                            for n, date in enumerate(dates)
+                        ]
+                    }
+                }
+            }
+            for i in range(issues)
+        ]
+    }
+
+def github_events_fixture(dates: list, repos: int) -> list:
+    events = []
+    for date in dates:
+        for r in range(repos):
+            events.append({"type": "PushEvent", "created_at": f"{date}T10:00:00Z", "repo": {"name": f"bench/repo-{r}"}})
+            events.append({
+                "type": "PullRequestEvent", "created_at": f"{date}T11:00:00Z", "repo": {"name": f"bench/repo-{r}"},
+                "payload": {"action": "opened", "pull_request": {
+                    "title": f"Change {r} on {date}", "html_url": f"https://github.bench/pr/{r}-{date}"
+                }}
+            })
+    return events
+
+def github_commits_fixture(repo: str, dates: list) -> list:
+    return [
+        {
+            "sha": f"{repo}-{date}-{n}",
+            "commit": {
+                "message": f"Commit {n} in {repo}\n\nDetails",
+                "committer": {"date": f"{date}T12:0{n}:00Z"}
+            }
+        }
+        for date in dates
+        for n in range(3)
+    ]
+
+def upstream_transport(args, dates: list, calls: Counter):
+    import httpx
+
+    jira_body = json.dumps(jira_fixture(dates, args.issues, "dev@bench")).encode()
+    events_body = json.dumps(github_events_fixture(dates, args.repos)).encode()
+    commits_bodies = {
+        f"bench/repo-{r}": json.dumps(github_commits_fixture(f"bench/repo-{r}", dates)).encode()
+        for r in range(args.repos)
+    }
+    headers = {"Content-Type": "application/json"}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        path = request.url.path
+        if host == "jira.bench":
+            calls["jira " + re.sub(r"/issue/[^/]+/", "/issue/{key}/", path)] += 1
+            await asyncio.sleep(args.jira_latency)
+            return httpx.Response(200, content=jira_body, headers=headers)
+
+        calls["github " + re.sub(r"^/(users|repos)/.+?/(events|commits)$", r"/\1/{name}/\2", path)] += 1
+        await asyncio.sleep(args.github_latency)
+        if path.endswith("/events"):
+            page = int(request.url.params.get("page", "1"))
+            return httpx.Response(200, content=events_body if page == 1 else b"[]", headers=headers)
+        match = re.match(r"^/repos/(.+)/commits$", path)
+        if match:
+            return httpx.Response(200, content=commits_bodies.get(match.group(1), b"[]"), headers=headers)
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    return httpx.MockTransport(handler)
+
+def start_fake_llm(port: int, latency: float, calls: Counter):
+    """
+    Serves an OpenAI-compatible /v1/chat/completions on localhost in a
+    background thread. Batch remark prompts get a JSON answer with one remark
+    per date so the real parsing path runs.
+    """
+    import uvicorn
+    from fastapi import FastAPI, Request
+
+    llm_app = FastAPI()
+
+    @llm_app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+        calls["llm /v1/chat/completions"] += 1
+        await asyncio.sleep(latency)
+
+        dates = re.findall(r"### Date: (\d{4}-\d{2}-\d{2})", prompt)
+        if dates:
+            content = json.dumps({"remarks": [{"date": date, "remark": f"Worked on tasks for {date}."} for date in dates]})
+        else:
+            content = "1. **Work Log Breakdown**: Synthetic issue work.\n2. **Blockers**: None."
+        return {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "bench"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        }
+
+    server = uvicorn.Server(uvicorn.Config(llm_app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+async def run_load(client, method: str, url: str, body: dict, total: int, concurrency: int) -> dict:
+    latencies = []
+    statuses = Counter()
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+        "statuses": dict(statuses)
+    }
+
+async def bench(args, llm_calls: Counter):
+    import httpx
+    import main
+    from dates import recent_dates
+    from github_client import GitHubClient
+    from jira_client import JiraClient
+
+    dates = recent_dates(args.days)
+    upstream_calls = Counter()
+    transport = upstream_transport(args, dates, upstream_calls)
+    # Route the app's upstream clients through the fixtures
+    main.JiraClient = functools.partial(JiraClient, transport=transport)
+    main.GitHubClient = functools.partial(GitHubClient, transport=transport)
+
+    bodies = {
+        "timesheet": ("/timesheet/generate", {
+            "jira_email": "dev@bench", "jira_project_key": "BENCH", "github_username": "bench-dev",
+            "days": args.days, "employee_id": "E1", "employee_name": "Bench Dev", "llm_provider": "openai"
+        }),
+        "summary": ("/activity/summary", {
+            "developer_email": "dev@bench", "date": dates[0], "llm_provider": "openai"
+        }),
+    }
+    endpoints = ["timesheet", "summary"] if args.endpoint == "all" else [args.endpoint]
+
+    results = {}
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=None
+        ) as client:
+            for endpoint in endpoints:
+                url, body = bodies[endpoint]
+                # One untimed request so client construction and imports are not measured
+                await client.post(url, json=body)
+                upstream_calls.clear()
+                llm_calls.clear()
+                result = await run_load(client, "POST", url, body, args.requests, args.concurrency)
+                result["upstream_calls_per_request"] = {
+                    name: round(count / args.requests, 2)
+                    for name, count in sorted({**upstream_calls, **llm_calls}.items())
+                }
+                results[endpoint] = result
+    return results
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="autum-bench-")
+    llm_port = _free_port()
+    configure_env(args, workdir, llm_port)
+
+    llm_calls = Counter()
+    server, thread = start_fake_llm(llm_port, args.llm_latency, llm_calls)
+    try:
+        results = asyncio.run(bench(args, llm_calls))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+    print(f"days={args.days} issues={args.issues} repos={args.repos} concurrency={args.concurrency} "
+          f"latency jira={args.jira_latency}s github={args.github_latency}s llm={args.llm_latency}s "
+          f"warm={args.warm} coalesce={not args.no_coalesce}")
+    for endpoint, result in results.items():
+        print(f"\n{endpoint}:")
+        print(f"  {result['requests']} requests in {result['elapsed_s']} s -> {result['throughput_rps']} req/s")
+        print(f"  p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  max {result['max_ms']} ms")
+        print(f"  statuses {result['statuses']}")
+        for name, per_request in result["upstream_calls_per_request"].items():
+            print(f"  {name}: {per_request}/request")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+CPU and memory per request for large team payloads, fully offline.
+
+    python benchmarks/bench_payloads.py [--members 40] [--issues 300] [--worklogs 30]
+        [--days 5] [--repos 10] [--commits 300] [--requests 5] [--stdlib-json]
+
+Serves one big Jira team search (paged 100 issues at a time, worklogs from
+every member with ADF comments) and a GitHub events feed plus commit pages
+from memory through an httpx MockTransport, then runs the team Jira lookup
+and one GitHub range lookup per request. Reports CPU time (process time)
+and peak traced Python memory per request; upstream latency is zero so the
+numbers are the app's own parsing, slimming and bucketing.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--members", type=int, default=40)
+    parser.add_argument("--issues", type=int, default=300, help="Issues in the team search")
+    parser.add_argument("--worklogs", type=int, default=30, help="Worklogs per issue")
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--commits", type=int, default=300, help="Commits per repo")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--stdlib-json", action="store_true", help="Parse with the json module even if orjson is installed")
+    return parser.parse_args()
+
+def configure_env(workdir: str):
+    # Must run before the app modules are imported; they read config at import time
+    os.environ.update({
+        "JIRA_URL": "https://jira.bench",
+        "ACTIVITY_STORE_ENABLED": "false",
+        "ACTIVITY_STORE_PATH": os.path.join(workdir, "activity_store.db"),
+        "UPSTREAM_STATE_PATH": os.path.join(workdir, "upstream_state.db"),
+        "SINGLEFLIGHT_ENABLED": "false",
+    })
+
+def _adf(text: str) -> dict:
+    return {"type": "doc", "version": 1, "content": [
+        {"type": "paragraph", "content": [{"type": "text", "text": text}]},
+        {"type": "bulletList", "content": [
+            {"type": "listItem", "content": [{"type": "paragraph", "content": [
+                {"type": "text", "text": f"{text} (detail {n})", "marks": [{"type": "strong"}]}
+            ]}]}
+            for n in range(3)
+        ]}
+    ]}
+
+def _user(email: str) -> dict:
+    # Jira embeds the whole user object, avatars included, in every worklog
+    return {
+        "self": f"https://jira.bench/rest/api/3/user?accountId={email}",
+        "accountId": email, "emailAddress": email, "displayName": email.split("@")[0].title(),
+        "active": True, "timeZone": "Europe/London", "accountType": "atlassian",
+        "avatarUrls": {size: f"https://avatars.bench/{email}/{size}.png" for size in ("48x48", "24x24", "16x16", "32x32")}
+    }
+
+def jira_pages(args, dates: list, emails: list) -> list:
+    issues = []
+    for i in range(args.issues):
+        worklogs = []
+        for n in range(args.worklogs):
+            email = emails[(i + n) % len(emails)]
+            date = dates[n % len(dates)]
+            worklogs.append({
+                "self": f"https://jira.bench/rest/api/3/issue/{10000 + i}/worklog/{i * 1000 + n}",
+                "author": _user(email), "updateAuthor": _user(email),
+                "comment": _adf(f"Work on part {n} of issue {i}"),
+                "created": f"{date}T18:00:00.000+0000", "updated": f"{date}T18:00:00.000+0000",
+                "started": f"{date}T09:00:00.000+0000", "timeSpent": "30m", "timeSpentSeconds": 1800,
+                "id": str(i * 1000 + n), "issueId": str(10000 + i)
+            })
+        issues.append({
+            "expand": "operations,versionedRepresentations,editmeta,changelog,renderedFields",
+            "id": str(10000 + i), "self": f"https://jira.bench/rest/api/3/issue/{10000 + i}", "key": f"TEAM-{i}",
+            "fields": {
+                "summary": f"Team issue {i}",
+                "status": {
+                    "self": "https://jira.bench/rest/api/3/status/3", "description": "", "id": "3",
+                    "name": ["In Progress", "Done", "To Do"][i % 3],
+                    "statusCategory": {"self": "https://jira.bench/rest/api/3/statuscategory/4", "id": 4,
+                                       "key": "indeterminate", "colorName": "yellow", "name": "In Progress"}
+                },
+                "worklog": {"startAt": 0, "maxResults": args.worklogs, "total": args.worklogs, "worklogs": worklogs}
+            }
+        })
+
+    pages = []
+    for start in range(0, len(issues), 100):
+        last = start + 100 >= len(issues)
+        page = {"issues": issues[start:start + 100], "isLast": last}
+        if not last:
+            page["nextPageToken"] = str(start + 100)
+        pages.append(json.dumps(page).encode())
+    return pages
+
+def github_bodies(args, dates: list) -> tuple:
+    events = []
+    for date in dates:
+        for r in range(args.repos):
+            repo = {"id": r, "name": f"bench/repo-{r}", "url": f"https://api.github.bench/repos/bench/repo-{r}"}
+            events.append({"id": f"push-{r}-{date}", "type": "PushEvent", "created_at": f"{date}T10:00:00Z",
+                           "actor": {"login": "bench-dev"}, "repo": repo, "payload": {"size": 3}})
+            events.append({"id": f"pr-{r}-{date}", "type": "PullRequestEvent", "created_at": f"{date}T11:00:00Z",
+                           "actor": {"login": "bench-dev"}, "repo": repo, "payload": {"action": "opened", "pull_request": {
+                               "title": f"Change {r} on {date}", "html_url": f"https://github.bench/pr/{r}-{date}",
+                               "body": "Description " * 50
+                           }}})
+
+    def commit(repo: str, n: int) -> dict:
+        date = dates[n % len(dates)]
+        person = {"name": "Bench Dev", "email": "dev@bench", "date": f"{date}T12:00:00Z"}
+        account = {"login": "bench-dev", "id": 1, "avatar_url": "https://avatars.bench/1", "type": "User",
+                   "url": "https://api.github.bench/users/bench-dev", "html_url": "https://github.bench/bench-dev"}
+        sha = f"{repo}-{n}".encode().hex()[:40].ljust(40, "0")
+        return {
+            "sha": sha, "node_id": "C_" + sha, "url": f"https://api.github.bench/repos/{repo}/commits/{sha}",
+            "html_url": f"https://github.bench/{repo}/commit/{sha}",
+            "commit": {"author": person, "committer": person, "message": f"Commit {n} in {repo}\n\n" + "Details. " * 20,
+                       "tree": {"sha": sha, "url": ""}, "comment_count": 0,
+                       "verification": {"verified": False, "reason": "unsigned", "signature": None, "payload": None}},
+            "author": account, "committer": account, "parents": [{"sha": sha, "url": ""}]
+        }
+
+    commits = {
+        f"bench/repo-{r}": [
+            [commit(f"bench/repo-{r}", n) for n in range(start, min(start + 100, args.commits))]
+            for start in range(0, args.commits, 100)
+        ]
+        for r in range(args.repos)
+    }
+    return json.dumps(events).encode(), {
+        repo: [json.dumps(page).encode() for page in pages] for repo, pages in commits.items()
+    }
+
+def transport(jira_body_pages: list, events_body: bytes, commit_pages: dict):
+    import httpx
+
+    headers = {"Content-Type": "application/json"}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if request.url.host == "jira.bench":
+            token = json.loads(request.content).get("nextPageToken")
+            return httpx.Response(200, content=jira_body_pages[int(token) // 100 if token else 0], headers=headers)
+        if path.endswith("/events"):
+            page = int(request.url.params.get("page", "1"))
+            return httpx.Response(200, content=events_body if page == 1 else b"[]", headers=headers)
+        repo = path[len("/repos/"):-len("/commits")]
+        page = int(request.url.params.get("page", "1"))
+        pages = commit_pages.get(repo, [])
+        link = {}
+        if page < len(pages):
+            link["Link"] = f'<https://api.github.com/repos/{repo}/commits?page={page + 1}>; rel="next"'
+        return httpx.Response(200, content=pages[page - 1] if pages else b"[]", headers={**headers, **link})
+
+    return httpx.MockTransport(handler)
+
+async def bench(args):
+    from dates import recent_dates
+    from github_client import GitHubClient
+    from jira_client import JiraClient
+
+    dates = recent_dates(args.days)
+    emails = [f"dev{m}@bench" for m in range(args.members)]
+    jira_body_pages = jira_pages(args, dates, emails)
+    events_body, commit_pages = github_bodies(args, dates)
+    mock = transport(jira_body_pages, events_body, commit_pages)
+    upstream_mb = (sum(map(len, jira_body_pages)) + len(events_body)
+                   + sum(len(page) for pages in commit_pages.values() for page in pages)) / 1e6
+
+    jira_client = JiraClient(transport=mock)
+    github_client = GitHubClient(token="bench", transport=mock)
+
+    async def one_request():
+        team = await jira_client.get_team_activity_range(emails, "TEAM", dates[-1], dates[0])
+        github = await github_client.get_activity_range("bench-dev", dates[-1], dates[0])
+        assert "error" not in team and "error" not in github, (team.get("error"), github.get("error"))
+        return team, github
+
+    # Warm-up: imports, client pools and the ADF code paths
+    await one_request()
+
+    cpu = []
+    peaks = []
+    for _ in range(args.requests):
+        tracemalloc.start()
+        started = time.process_time()
+        result = await one_request()
+        cpu.append(time.process_time() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del result
+
+    # CPU again without tracemalloc, which slows allocation-heavy code down
+    untraced = []
+    for _ in range(args.requests):
+        started = time.process_time()
+        await one_request()
+        untraced.append(time.process_time() - started)
+
+    await jira_client.aclose()
+    return upstream_mb, untraced, peaks
+
+def main():
+    args = parse_args()
+    configure_env(tempfile.mkdtemp(prefix="autum-bench-"))
+    if args.stdlib_json:
+        try:
+            import fast_json
+            fast_json.orjson = None
+        except ImportError:
+            pass
+
+    upstream_mb, cpu, peaks = asyncio.run(bench(args))
+    print(f"members={args.members} issues={args.issues} worklogs/issue={args.worklogs} days={args.days} "
+          f"repos={args.repos} commits/repo={args.commits} stdlib_json={args.stdlib_json}")
+    print(f"  upstream payload {upstream_mb:.1f} MB per request")
+    print(f"  CPU   mean {sum(cpu) / len(cpu) * 1000:.0f} ms  min {min(cpu) * 1000:.0f} ms per request")
+    print(f"  peak  mean {sum(peaks) / len(peaks) / 1e6:.1f} MB  max {max(peaks) / 1e6:.1f} MB traced per request")
+
+if __name__ == "__main__":
+    main()
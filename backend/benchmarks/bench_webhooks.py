@@ -0,0 +1,203 @@
+"""
+Benchmark of webhook ingestion and of activity reads served from the index.
+
+    python benchmarks/bench_webhooks.py [--days 5] [--issues 10] [--repos 3]
+        [--webhooks 200] [--reads 200] [--jira-latency 1.0] [--github-latency 1.0]
+
+One backfill per source goes through slow MockTransport upstreams (the
+given latency in seconds), then webhook payloads in the shape Jira Cloud and
+GitHub deliver are replayed, signed, through /webhooks/*. Finally the Jira
+and GitHub range lookups the timesheet endpoints make are timed; once the
+days are indexed they should make no upstream calls at all.
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_api import upstream_transport
+
+EMAIL = "dev@bench"
+USERNAME = "bench-dev"
+SECRET = "bench-secret"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--issues", type=int, default=10, help="Jira issues per day")
+    parser.add_argument("--repos", type=int, default=3, help="GitHub repos with pushes")
+    parser.add_argument("--webhooks", type=int, default=200, help="Deliveries to replay")
+    parser.add_argument("--reads", type=int, default=200, help="Indexed range lookups to time")
+    parser.add_argument("--jira-latency", type=float, default=1.0)
+    parser.add_argument("--github-latency", type=float, default=1.0)
+    return parser.parse_args()
+
+def configure_env(workdir: str):
+    # Must run before the app modules are imported; they read config at import time
+    os.environ.update({
+        "JIRA_URL": "https://jira.bench",
+        "GITHUB_TOKEN": "bench",
+        "ACTIVITY_INDEX_PATH": os.path.join(workdir, "activity_index.db"),
+        "ACTIVITY_STORE_PATH": os.path.join(workdir, "activity_store.db"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "JOB_STORE_PATH": os.path.join(workdir, "jobs.db"),
+        "UPSTREAM_STATE_PATH": os.path.join(workdir, "upstream_state.db"),
+        "WEBHOOK_INDEX_ENABLED": "true",
+        "ACTIVITY_STORE_ENABLED": "false",
+        "JIRA_WEBHOOK_SECRET": SECRET,
+        "GITHUB_WEBHOOK_SECRET": SECRET,
+        "BULK_WORKERS": "0",
+        "JIRA_RATE_PER_SEC": "100000", "JIRA_RATE_BURST": "100000",
+        "GITHUB_RATE_PER_SEC": "100000", "GITHUB_RATE_BURST": "100000",
+    })
+
+def jira_worklog_delivery(n: int, date: str, issues: int) -> dict:
+    return {
+        "timestamp": int(time.time() * 1000),
+        "webhookEvent": "worklog_created",
+        "worklog": {
+            "self": f"https://jira.bench/rest/api/2/issue/{10000 + n % issues}/worklog/{90000 + n}",
+            "author": {"accountId": "bench-dev", "emailAddress": EMAIL, "displayName": "Bench Dev", "active": True},
+            "updateAuthor": {"accountId": "bench-dev", "displayName": "Bench Dev", "active": True},
+            "comment": f"Webhook worklog {n}",
+            "created": f"{date}T17:00:00.000+0000",
+            "updated": f"{date}T17:00:00.000+0000",
+            "started": f"{date}T16:00:00.000+0000",
+            "timeSpent": "15m",
+            "timeSpentSeconds": 900,
+            "id": str(90000 + n),
+            "issueId": str(10000 + n % issues)
+        }
+    }
+
+def github_push_delivery(n: int, date: str, repos: int) -> dict:
+    repo = f"bench/repo-{n % repos}"
+    sha = hashlib.sha1(f"push-{n}".encode()).hexdigest()
+    return {
+        "ref": "refs/heads/main",
+        "before": "0" * 40,
+        "after": sha,
+        "repository": {"full_name": repo, "default_branch": "main", "private": True},
+        "pusher": {"name": USERNAME, "email": EMAIL},
+        "sender": {"login": USERNAME, "type": "User"},
+        "commits": [{
+            "id": sha,
+            "distinct": True,
+            "message": f"Webhook commit {n}\n\nDetails",
+            "timestamp": f"{date}T15:00:00+02:00",
+            "author": {"name": "Bench Dev", "email": EMAIL, "username": USERNAME},
+            "committer": {"name": "Bench Dev", "email": EMAIL, "username": USERNAME},
+            "added": [], "removed": [], "modified": ["README.md"]
+        }]
+    }
+
+def github_pull_request_delivery(n: int, date: str, repos: int) -> dict:
+    repo = f"bench/repo-{n % repos}"
+    return {
+        "action": "opened",
+        "number": n,
+        "pull_request": {
+            "title": f"Webhook change {n}",
+            "html_url": f"https://github.bench/{repo}/pull/{n}",
+            "state": "open",
+            "updated_at": f"{date}T14:00:00Z",
+            "user": {"login": USERNAME}
+        },
+        "repository": {"full_name": repo, "default_branch": "main"},
+        "sender": {"login": USERNAME, "type": "User"}
+    }
+
+def _sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+def _summary(latencies: list) -> str:
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return (f"p50 {statistics.median(latencies) * 1000:.2f} ms  p99 {p99 * 1000:.2f} ms  "
+            f"max {latencies[-1] * 1000:.2f} ms")
+
+async def bench(args):
+    import httpx
+    import main
+    from dates import recent_dates
+    from github_client import GitHubClient
+    from jira_client import JiraClient
+
+    dates = recent_dates(args.days)
+    start_date, end_date = dates[-1], dates[0]
+    upstream_calls = Counter()
+    transport = upstream_transport(args, dates, upstream_calls)
+    main.JiraClient = functools.partial(JiraClient, transport=transport)
+
+    async with main.lifespan(main.app):
+        jira_client = main.app.state.jira_client
+        github_client = GitHubClient(token="bench", limiter=main.limiter, index=main.activity_index,
+                                     transport=transport)
+
+        async def read():
+            return await asyncio.gather(
+                jira_client.get_developer_activity_range(EMAIL, start_date, end_date),
+                github_client.get_activity_range(USERNAME, start_date, end_date)
+            )
+
+        started = time.perf_counter()
+        await read()
+        backfill = time.perf_counter() - started
+        backfill_calls = sum(upstream_calls.values())
+
+        ingest = []
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            for n in range(args.webhooks):
+                date = dates[n % len(dates)]
+                kind = n % 3
+                if kind == 0:
+                    url, body, headers = "/webhooks/jira", jira_worklog_delivery(n, date, args.issues), {}
+                elif kind == 1:
+                    url, body, headers = "/webhooks/github", github_push_delivery(n, date, args.repos), \
+                        {"X-GitHub-Event": "push"}
+                else:
+                    url, body, headers = "/webhooks/github", github_pull_request_delivery(n, date, args.repos), \
+                        {"X-GitHub-Event": "pull_request"}
+                content = json.dumps(body).encode()
+                signature_header = "X-Hub-Signature" if url == "/webhooks/jira" else "X-Hub-Signature-256"
+                started = time.perf_counter()
+                response = await client.post(url, content=content, headers={
+                    **headers, signature_header: _sign(content), "Content-Type": "application/json"
+                })
+                ingest.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+
+        upstream_calls.clear()
+        reads = []
+        for _ in range(args.reads):
+            started = time.perf_counter()
+            jira_by_date, github_by_date = await read()
+            reads.append(time.perf_counter() - started)
+
+    jira_seconds = sum(day["total_time_seconds"] for day in jira_by_date.values())
+    github_items = sum(len(items) for items in github_by_date.values())
+    print(f"days={args.days} issues={args.issues} repos={args.repos} "
+          f"latency jira={args.jira_latency}s github={args.github_latency}s")
+    print(f"\nbackfill: {backfill * 1000:.1f} ms, {backfill_calls} upstream calls")
+    print(f"\nwebhook ingest ({args.webhooks} deliveries):\n  {_summary(ingest)}")
+    print(f"\nindexed Jira + GitHub range lookup ({args.reads} reads):\n  {_summary(reads)}")
+    print(f"  upstream calls {sum(upstream_calls.values())}")
+    print(f"  jira hours {jira_seconds / 3600:.2f}, github items {github_items}")
+
+def main():
+    args = parse_args()
+    configure_env(tempfile.mkdtemp(prefix="autum-bench-"))
+    asyncio.run(bench(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+from datetime import datetime, timedelta
+from typing import List
+
+def date_range(start_date: str, end_date: str) -> List[str]:
+    """
+    Returns every YYYY-MM-DD date from start_date to end_date, inclusive.
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [
+        (start + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range((end - start).days + 1)
+    ]
+
+def recent_dates(days: int) -> List[str]:
+    """
+    Returns the last `days` dates ending today, most recent first.
+    """
+    today = datetime.now()
+    return [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
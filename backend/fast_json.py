@@ -0,0 +1,28 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the json module
+    orjson = None
+
+# orjson parses into its own document tree before building Python objects,
+# which briefly needs about 15x the body in memory; bodies larger than this
+# (e.g. full Jira search pages) go through the json module instead
+ORJSON_MAX_BYTES = int(os.getenv("ORJSON_MAX_BYTES", str(1024 * 1024)))
+
+def loads(data):
+    """
+    Parses JSON from bytes or str, with orjson when it is installed.
+    """
+    if orjson is not None and len(data) <= ORJSON_MAX_BYTES:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(value) -> str:
+    """
+    Serializes to compact JSON text, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"))
@@ -1,9 +1,100 @@
+import asyncio
 import httpx
+import os
+import time
+from dataclasses import dataclass
+from dates import date_range
+from fast_json import loads
+from singleflight import SingleFlight
+from tracing import span, count_cache, observe_upstream
+from upstream_state import credential_key, retry_after_seconds, RateLimitExceeded
 from typing import List, Dict, Any, Optional
 
+class GitHubError(Exception):
+    """
+    Raised for an unexpected GitHub response, so it surfaces as an error
+    instead of as a day with no activity.
+    """
+
+@dataclass(slots=True)
+class GitHubCommit:
+    """
+    The fields of a commit listing that activity is built from, so a long
+    commit history is not kept around as full API payloads.
+    """
+    sha: str
+    message: str
+    date: str  # committer date, YYYY-MM-DD
+
+    @classmethod
+    def from_api(cls, commit: dict) -> "GitHubCommit":
+        details = commit.get("commit", {})
+        # since/until filter on the committer date, so bucket on it too
+        committed = details.get("committer") or details.get("author") or {}
+        return cls(sha=commit.get("sha", ""), message=details.get("message", ""), date=committed.get("date", "")[:10])
+
+# Pull request actions activity is built from; label, assignment and review
+# events would only add noise to the remarks
+PR_ACTIONS = {"opened", "closed", "reopened"}
+
+# Activity items, built the same way from the events feed and from webhooks (see activity_index)
+
+def create_item(repo: str, ref: Optional[str], ref_type: Optional[str], date: str) -> dict:
+    return {
+        "type": "CreateEvent",
+        "repo": repo,
+        "ref": ref,
+        "ref_type": ref_type,
+        "summary": f"Created {ref_type} '{ref}'",
+        "key": f"create-{ref}-{date}",
+        "description": f"Created {ref_type} '{ref}' in {repo}"
+    }
+
+def pull_request_item(repo: str, action: str, title: Optional[str], url: Optional[str]) -> dict:
+    return {
+        "type": "PullRequestEvent",
+        "repo": repo,
+        "action": action,
+        "summary": f"PR {action}: {title}",
+        "key": url,
+        "description": f"Pull Request: {title} ({action})"
+    }
+
+def commit_item(repo: str, sha: str, message: str) -> dict:
+    return {
+        "type": "Commit",
+        "repo": repo,
+        "key": sha,
+        "summary": message.split("\n")[0],
+        "description": message
+    }
+
+# Clients are built per request, so in-flight scans are coalesced across all of them
+_flights = SingleFlight("github_activity")
+
 class GitHubClient:
-    def __init__(self, token: Optional[str] = None):
+    def __init__(self, token: Optional[str] = None, store=None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, limiter=None, index=None):
         self.token = token
+        # Optional UpstreamLimiter: calls take a slot from this token's bucket,
+        # and a used-up quota queues them until the reset instead of failing
+        self.limiter = limiter
+        self.limiter_key = credential_key("github", token)
+        self.rate = float(os.getenv("GITHUB_RATE_PER_SEC", "10"))
+        self.burst = float(os.getenv("GITHUB_RATE_BURST", "20"))
+        self.max_retries = int(os.getenv("GITHUB_MAX_RETRIES", "2"))
+        # Custom transport for tests and benchmarks; None uses the network
+        self.transport = transport
+        # Optional ActivityStore; finalised days are served from it and recent
+        # days are revalidated with If-None-Match on the events feed. Days are
+        # stored per token, since tokens see different (private) repos.
+        self.store = store
+        # Optional ActivityIndex fed by webhooks; days it covers need no fetch,
+        # and every fetch is written back to it as a reconciliation. It holds
+        # what the server's token sees, so only that token reads or writes it.
+        self.index = index
+        self.server_token = bool(token) and token == os.getenv("GITHUB_TOKEN")
+        self.repo_concurrency = int(os.getenv("GITHUB_REPO_CONCURRENCY", "5"))
         self.headers = {
             "Accept": "application/vnd.github.v3+json"
         }
@@ -14,108 +105,238 @@ class GitHubClient:
         """
         Fetches GitHub activity for a user across all repositories on a specific date.
         """
+        activity = await self.get_activity_range(username, date, date)
+        if "error" in activity:
+            return [activity]
+        return activity[date]
+
+    async def get_activity_range(self, username: str, start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        Fetches GitHub activity for a user over an inclusive date range with one scan
+        of the events feed and one commits query per active repo.
+        Returns a map of date -> the same list get_activity returns for that date.
+        Concurrent calls with the same token, user and range share one scan.
+        """
+        return await _flights.do(
+            (self.limiter_key, username, start_date, end_date),
+            self._get_activity_range, username, start_date, end_date
+        )
+
+    async def _get_activity_range(self, username: str, start_date: str, end_date: str) -> Dict[str, Any]:
         if not self.token:
-            return [{"error": "GitHub token not configured"}]
+            return {"error": "GitHub token not configured", "unconfigured": True}
+
+        dates = date_range(start_date, end_date)
+        store_user = f"{username}@{self.limiter_key}"
+        stored = await asyncio.to_thread(self.store.get_days, "github", store_user, dates) if self.store else {}
+        activity = {
+            date: stored[date]["payload"]
+            for date in dates
+            if date in stored and self.store.is_settled(date, stored[date]["fetched_at"])
+        }
+        todo = [date for date in dates if date not in activity]
+        if self.store:
+            count_cache("activity_github", hits=len(activity), misses=len(todo))
+        indexing = self.index is not None and self.index.enabled and self.server_token
+        if indexing and todo:
+            indexed = await asyncio.to_thread(self.index.github_days, username, todo)
+            count_cache("activity_index_github", hits=len(indexed), misses=len(todo) - len(indexed))
+            activity.update(indexed)
+            todo = [date for date in todo if date not in indexed]
+        if not todo:
+            return {date: activity[date] for date in dates}
 
-        activity_list = []
-        async with httpx.AsyncClient() as client:
+        # The stored days can only be revalidated together if they were built from the same feed
+        etags = {stored[date]["etag"] for date in todo if date in stored}
+        etag = etags.pop() if len(etags) == 1 and all(date in stored for date in todo) else None
+
+        fetched_at = time.time()
+        async with httpx.AsyncClient(transport=self.transport) as client:
             try:
-                # 1. Identify active repositories from User Events
-                events_url = f"https://api.github.com/users/{username}/events"
-                params = {"per_page": 100}
-                
-                active_repos = set()
-                page = 1
-                
-                # Scan events to find active repos and non-commit events
-                while True:
-                    response = await client.get(events_url, headers=self.headers, params={**params, "page": page})
-                    if response.status_code != 200:
-                        break
-                        
-                    events = response.json()
-                    
-                    if not events:
-                        break
-                    
-                    for event in events:
-                        created_at = event.get("created_at", "")[:10] # YYYY-MM-DD
-                        
-                        if created_at == date:
-                            repo_name = event.get("repo", {}).get("name")
-                            event_type = event.get("type")
-                            
-                            if event_type == "PushEvent":
-                                if repo_name:
-                                    active_repos.add(repo_name)
-                            elif event_type == "CreateEvent":
-                                if repo_name:
-                                    active_repos.add(repo_name)
-                                # Log creation event
-                                ref_type = event.get("payload", {}).get("ref_type")
-                                ref = event.get("payload", {}).get("ref", "unknown")
-                                activity_list.append({
-                                    "type": event_type,
-                                    "repo": repo_name,
-                                    "ref": ref,
-                                    "ref_type": ref_type,
-                                    "summary": f"Created {ref_type} '{ref}'",
-                                    "key": f"create-{ref}-{created_at}",
-                                    "description": f"Created {ref_type} '{ref}' in {repo_name}"
-                                })
-                            elif event_type == "PullRequestEvent":
-                                repo_name = event.get("repo", {}).get("name", "unknown")
-                                action = event.get("payload", {}).get("action")
-                                title = event.get("payload", {}).get("pull_request", {}).get("title")
-                                pr_url = event.get("payload", {}).get("pull_request", {}).get("html_url")
-                                activity_list.append({
-                                    "type": event_type,
-                                    "repo": repo_name,
-                                    "action": action,
-                                    "summary": f"PR {action}: {title}",
-                                    "key": pr_url,
-                                    "description": f"Pull Request: {title} ({action})"
-                                })
-                                
-                        elif created_at < date:
-                            # Events are sorted by date
-                            break
-                    else:
-                        # Continue to next page
-                        page += 1
-                        if page > 3: break
-                        continue
-                    break # Break out of while loop if we hit older dates
-
-                # 2. Fetch specific commits for active repositories
-                for repo in active_repos:
-                    try:
-                        commits_url = f"https://api.github.com/repos/{repo}/commits"
-                        commit_params = {
-                            "author": username,
-                            "since": f"{date}T00:00:00Z",
-                            "until": f"{date}T23:59:59Z",
-                            "per_page": 100
-                        }
-                        
-                        resp = await client.get(commits_url, headers=self.headers, params=commit_params)
-                        if resp.status_code == 200:
-                            commits = resp.json()
-                            
-                            for commit in commits:
-                                msg = commit.get("commit", {}).get("message", "")
-                                sha = commit.get("sha", "")
-                                summary = msg.split('\n')[0]
-                                activity_list.append({
-                                    "type": "Commit",
-                                    "repo": repo,
-                                    "key": sha,
-                                    "summary": summary,
-                                    "description": msg
-                                })
-                    except Exception:
-                        continue # Skip repo on error
-
-                return activity_list
+                with span("github.activity", days=len(todo), revalidate=etag is not None) as current:
+                    fresh, new_etag = await self._scan_range(client, username, todo[0], todo[-1], etag)
+                    current.set("not_modified", fresh is None)
             except Exception as e:
-                return [{"error": f"Error fetching GitHub data: {str(e)}"}]
+                return {"error": f"Error fetching GitHub data: {str(e)}", "rate_limited": isinstance(e, RateLimitExceeded)}
+
+        if fresh is None:
+            # 304: nothing new since the stored copy
+            fresh = {date: stored[date]["payload"] for date in todo}
+            new_etag = etag
+            fetched_at = min(stored[date]["fetched_at"] for date in todo)
+        else:
+            fresh = {date: fresh[date] for date in todo}
+
+        if indexing:
+            await asyncio.to_thread(self.index.reconcile_github, username, fresh, fetched_at)
+
+        if self.store and new_etag:
+            await asyncio.to_thread(self.store.put_days, "github", store_user, fresh, etag=new_etag)
+        activity.update(fresh)
+        return {date: activity[date] for date in dates}
+
+    async def _scan_range(self, client: httpx.AsyncClient, username: str, start_date: str, end_date: str,
+                          etag: Optional[str] = None):
+        """
+        Returns (date -> activity list, ETag of the first events page), or
+        (None, None) when the events feed still matches `etag`.
+        """
+        dates = date_range(start_date, end_date)
+        activity = {date: [] for date in dates}
+        new_etag = None
+
+        # 1. Identify active repositories from User Events
+        events_url = f"https://api.github.com/users/{username}/events"
+        params = {"per_page": 100}
+
+        active_repos = set()
+        page = 1
+
+        # Scan events to find active repos and non-commit events
+        while True:
+            headers = self.headers
+            if page == 1 and etag:
+                headers = {**self.headers, "If-None-Match": etag}
+
+            with span("github.events_page", page=page) as current:
+                response = await self._get(client, events_url, headers=headers, params={**params, "page": page})
+                current.set("status", response.status_code)
+            if response.status_code == 304:
+                # 304s don't count against the rate limit
+                return None, None
+            if response.status_code != 200:
+                raise GitHubError(f"GitHub events returned {response.status_code}: {response.text[:200]}")
+            if page == 1:
+                new_etag = response.headers.get("ETag")
+
+            events = loads(response.content)
+
+            if not events:
+                break
+
+            for event in events:
+                created_at = event.get("created_at", "")[:10] # YYYY-MM-DD
+
+                if created_at in activity:
+                    repo_name = event.get("repo", {}).get("name")
+                    event_type = event.get("type")
+
+                    if event_type == "PushEvent":
+                        if repo_name:
+                            active_repos.add(repo_name)
+                    elif event_type == "CreateEvent":
+                        if repo_name:
+                            active_repos.add(repo_name)
+                        # Log creation event
+                        ref_type = event.get("payload", {}).get("ref_type")
+                        ref = event.get("payload", {}).get("ref", "unknown")
+                        activity[created_at].append(create_item(repo_name, ref, ref_type, created_at))
+                    elif event_type == "PullRequestEvent" and event.get("payload", {}).get("action") in PR_ACTIONS:
+                        repo_name = event.get("repo", {}).get("name", "unknown")
+                        action = event.get("payload", {}).get("action")
+                        title = event.get("payload", {}).get("pull_request", {}).get("title")
+                        pr_url = event.get("payload", {}).get("pull_request", {}).get("html_url")
+                        activity[created_at].append(pull_request_item(repo_name, action, title, pr_url))
+
+                elif created_at < start_date:
+                    # Events are sorted by date
+                    break
+            else:
+                # Continue to next page
+                page += 1
+                if page > 3: break
+                continue
+            break # Break out of while loop if we hit older dates
+
+        # 2. Fetch specific commits for active repositories, a few repos at a time
+        repo_limit = asyncio.Semaphore(self.repo_concurrency)
+        repo_commits = await asyncio.gather(*(
+            self._get_repo_commits(client, repo_limit, repo, username, start_date, end_date)
+            for repo in sorted(active_repos)
+        ))
+
+        # The same SHA can show up in several repos (e.g. forks); keep the first
+        seen_shas = set()
+        for commits in repo_commits:
+            for date, commit in commits:
+                if commit["key"] in seen_shas or date not in activity:
+                    continue
+                seen_shas.add(commit["key"])
+                activity[date].append(commit)
+
+        return activity, new_etag
+
+    async def _get_repo_commits(self, client: httpx.AsyncClient, limit: asyncio.Semaphore,
+                                repo: str, username: str, start_date: str, end_date: str) -> list:
+        """
+        Returns (date, commit activity) pairs for the user's commits to the repo.
+        """
+        commits_url = f"https://api.github.com/repos/{repo}/commits"
+        commit_params = {
+            "author": username,
+            "since": f"{start_date}T00:00:00Z",
+            "until": f"{end_date}T23:59:59Z",
+            "per_page": 100
+        }
+
+        try:
+            async with limit:
+                with span("github.repo_commits", repo=repo) as current:
+                    commits = await self._get_paginated(client, commits_url, commit_params, GitHubCommit.from_api)
+                    current.set("commits", len(commits))
+        except RateLimitExceeded:
+            raise
+        except Exception:
+            return [] # Skip repo on error (e.g. an empty or deleted repo)
+
+        return [(commit.date, commit_item(repo, commit.sha, commit.message)) for commit in commits]
+
+    async def _get_paginated(self, client: httpx.AsyncClient, url: str, params: dict, parse) -> list:
+        """
+        GETs a list endpoint and follows the Link header's rel="next" until the
+        last page. Each item goes through `parse` as its page is read.
+        """
+        items = []
+        next_url, next_params = url, params
+        while next_url:
+            with span("github.page", path=httpx.URL(next_url).path) as current:
+                response = await self._get(client, next_url, params=next_params)
+                current.set("status", response.status_code)
+            if response.status_code != 200:
+                raise GitHubError(f"GitHub returned {response.status_code} for {next_url}")
+            items.extend(parse(item) for item in loads(response.content))
+            # The next link already carries the query string
+            next_url, next_params = response.links.get("next", {}).get("url"), None
+        return items
+
+    async def _get(self, client: httpx.AsyncClient, url: str, headers: Optional[dict] = None,
+                   params: Optional[dict] = None) -> httpx.Response:
+        """
+        GETs through the rate limiter and records the quota GitHub reports.
+        A 403/429 caused by the rate limit (Retry-After, or no quota left) is
+        queued until the limit lifts and retried; RateLimitExceeded is raised
+        if it persists rather than returning the error response.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                await self.limiter.acquire(self.limiter_key, self.rate, self.burst)
+            response = await client.get(url, headers=headers or self.headers, params=params)
+            observe_upstream("github", response.status_code)
+            reset_in = None
+            if self.limiter:
+                reset_in = await asyncio.to_thread(self.limiter.observe, self.limiter_key, response.headers)
+            if response.status_code not in (403, 429):
+                return response
+
+            wait = retry_after_seconds(response)
+            if wait is None:
+                wait = reset_in
+            if wait is None:
+                # A permissions 403, not a rate limit
+                return response
+            if self.limiter:
+                # acquire() waits this out, for every worker using the token
+                await asyncio.to_thread(self.limiter.block, self.limiter_key, wait)
+            else:
+                await asyncio.sleep(wait)
+        raise RateLimitExceeded(f"GitHub rate limit still exceeded after {self.max_retries + 1} attempts")
@@ -0,0 +1,21 @@
+# Production server settings: gunicorn supervising uvicorn workers.
+#   gunicorn -c gunicorn.conf.py main:app
+# Caches, the activity store, job leases, upstream rate limits and the /metrics
+# snapshots are SQLite files (WAL), so every worker shares them.
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn_worker.UvicornWorker"
+# LLM calls and NDJSON streams can run long; a worker silent for this long is restarted
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "180"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Recycle workers now and then to cap slow memory growth; jitter avoids restarting all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+accesslog = "-"
@@ -1,8 +1,20 @@
-import requests
-from requests.auth import HTTPBasicAuth
+import asyncio
+import httpx
+import importlib.util
 import os
-import json
-from datetime import datetime
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from dates import date_range
+from fast_json import loads
+from singleflight import SingleFlight
+from tracing import span, count_cache, observe_upstream
+from upstream_state import credential_key, retry_after_seconds, RateLimitExceeded
+from typing import Optional
+
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
 
 def get_jira_headers():
     return {
@@ -13,89 +25,537 @@ def get_jira_headers():
 def get_jira_auth():
     email = os.getenv("JIRA_USERNAME")
     token = os.getenv("JIRA_API_TOKEN")
-    return HTTPBasicAuth(email, token)
+    return httpx.BasicAuth(email or "", token or "")
+
+# ADF nodes whose content starts on a new line
+ADF_BLOCK_NODES = {
+    "paragraph", "heading", "blockquote", "codeBlock", "bulletList", "orderedList",
+    "listItem", "taskList", "taskItem", "decisionList", "decisionItem", "panel",
+    "expand", "nestedExpand", "table", "tableRow", "tableHeader", "tableCell",
+    "mediaSingle", "mediaGroup", "rule"
+}
+
+# ADF leaf nodes that carry their text in attrs
+ADF_INLINE_NODES = {"hardBreak", "mention", "emoji", "status", "inlineCard", "blockCard", "embedCard"}
+
+# Worklog comments end up in prompts, so long ones are cut early
+ADF_MAX_CHARS = int(os.getenv("JIRA_COMMENT_MAX_CHARS", "4000"))
+
+def _extract_text_from_adf(node, max_chars: Optional[int] = None) -> str:
+    """
+    Extracts text from an Atlassian Document Format (ADF) node in a single
+    iterative pass. Inline text is concatenated, block nodes and hard breaks
+    become newlines, and mentions, emoji, status lozenges and smart links
+    contribute their display text. Stops once max_chars characters are written.
+    """
+    parts = []
+    append = parts.append
+    size = 0
+    budget = max_chars if max_chars is not None else -1
+    line_break = False
+    stack = [node]
+    pop = stack.pop
+    extend = stack.extend
+
+    while stack:
+        item = pop()
+        if item.__class__ is not dict:
+            if isinstance(item, list):
+                extend(reversed(item))
+            continue
 
-def _extract_text_from_adf(node):
+        text = item.get("text")
+        if text is None:
+            node_type = item.get("type")
+            if node_type in ADF_INLINE_NODES:
+                if node_type == "hardBreak":
+                    line_break = True
+                    continue
+                attrs = item.get("attrs") or {}
+                if node_type == "mention":
+                    text = attrs.get("text") or f"@{attrs.get('id', '')}"
+                elif node_type in ("emoji", "status"):
+                    text = attrs.get("text") or attrs.get("shortName")
+                else:
+                    text = attrs.get("url")
+            else:
+                content = item.get("content")
+                if content:
+                    # ADF never mixes inline and block siblings, so a break
+                    # before each block is enough to separate them
+                    if node_type in ADF_BLOCK_NODES:
+                        line_break = True
+                    extend(reversed(content))
+                continue
+
+        if not text:
+            continue
+        if line_break:
+            if parts:
+                append("\n")
+                size += 1
+            line_break = False
+        append(text)
+        if budget >= 0:
+            size += len(text)
+            if size >= budget:
+                break
+
+    text = "".join(parts)
+    return text[:max_chars] if max_chars is not None else text
+
+@dataclass(slots=True)
+class JiraWorklog:
+    """
+    The fields of a Jira worklog that bucketing and the activity index read;
+    the comment is already reduced from ADF to text.
     """
-    Recursively extracts text from an Atlassian Document Format (ADF) node.
+    id: Optional[str]
+    email: Optional[str]
+    account_id: Optional[str]
+    started: str
+    seconds: int
+    comment: Optional[str]
+
+    @classmethod
+    def from_api(cls, worklog: dict) -> "JiraWorklog":
+        author = worklog.get("author") or {}
+        return cls(
+            id=worklog.get("id"),
+            email=author.get("emailAddress"),
+            account_id=author.get("accountId"),
+            started=worklog.get("started", ""),
+            seconds=worklog.get("timeSpentSeconds", 0),
+            comment=worklog_comment(worklog)
+        )
+
+@dataclass(slots=True)
+class JiraIssue:
     """
-    if isinstance(node, dict):
-        if "text" in node:
-            return node["text"]
-        if "content" in node:
-            return " ".join([_extract_text_from_adf(child) for child in node["content"]])
-    elif isinstance(node, list):
-         return " ".join([_extract_text_from_adf(child) for child in node])
-    return ""
-
-def get_developer_activity(email: str, date: str):
+    A search result without everything _bucket_worklogs and the activity
+    index do not read, so a large search does not keep whole issue and
+    worklog payloads alive. `worklog_total` is how many worklogs Jira has,
+    which is more than len(worklogs) when the embedded list was cut off.
+    """
+    id: Optional[str]
+    key: str
+    summary: Optional[str]
+    status: Optional[str]
+    worklog_total: int
+    worklogs: list
+
+    @classmethod
+    def from_api(cls, issue: dict) -> "JiraIssue":
+        fields = issue.get("fields", {})
+        worklog = fields.get("worklog") or {}
+        worklogs = worklog.get("worklogs", [])
+        return cls(
+            id=issue.get("id"),
+            key=issue["key"],
+            summary=fields.get("summary"),
+            status=(fields.get("status") or {}).get("name"),
+            worklog_total=worklog.get("total", len(worklogs)),
+            worklogs=[JiraWorklog.from_api(w) for w in worklogs]
+        )
+
+class JiraClient:
+    """
+    Async Jira client built on one long-lived, pooled httpx.AsyncClient.
+    Create it once at startup and close it with aclose() at shutdown.
+    """
+    RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+    def __init__(self, jira_url: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 store=None, limiter=None, index=None):
+        self.jira_url = jira_url or os.getenv("JIRA_URL")
+        # Optional UpstreamLimiter shared with other worker processes: requests
+        # take a slot from the site's and account's bucket, and a Retry-After
+        # or exhausted quota holds all of them back
+        self.limiter = limiter
+        self.limiter_key = credential_key(
+            "jira", httpx.URL(self.jira_url).host if self.jira_url else "", os.getenv("JIRA_USERNAME")
+        )
+        self.rate = float(os.getenv("JIRA_RATE_PER_SEC", "10"))
+        self.burst = float(os.getenv("JIRA_RATE_BURST", "20"))
+        # Optional ActivityStore; finalised days are served from it and recent
+        # days are refreshed with an "updated >=" query
+        self.store = store
+        # Optional ActivityIndex fed by webhooks; days it covers need no fetch,
+        # and every range fetch is written back to it as a reconciliation
+        self.index = index
+        # Identical activity lookups arriving together share one fetch
+        self.flights = SingleFlight("jira_activity")
+        self.max_retries = int(os.getenv("JIRA_MAX_RETRIES", "3"))
+        self.backoff_base = float(os.getenv("JIRA_BACKOFF_BASE", "0.5"))
+        self.backoff_max = float(os.getenv("JIRA_BACKOFF_MAX", "30"))
+        # Issues whose embedded worklog list was cut off are re-read a few at a time
+        self.worklog_concurrency = int(os.getenv("JIRA_WORKLOG_CONCURRENCY", "5"))
+        self.worklog_page_size = int(os.getenv("JIRA_WORKLOG_PAGE_SIZE", "1000"))
+        self.client = httpx.AsyncClient(
+            headers=get_jira_headers(),
+            auth=get_jira_auth(),
+            timeout=httpx.Timeout(
+                float(os.getenv("JIRA_TIMEOUT", "30")),
+                connect=float(os.getenv("JIRA_CONNECT_TIMEOUT", "5"))
+            ),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("JIRA_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("JIRA_MAX_KEEPALIVE", "10")),
+                keepalive_expiry=float(os.getenv("JIRA_KEEPALIVE_EXPIRY", "30"))
+            ),
+            http2=HTTP2_AVAILABLE,
+            transport=transport
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Sends a request, retrying transport errors and 429/5xx responses with
+        exponential backoff. A Retry-After header takes precedence over the backoff.
+        """
+        attempt = 0
+        with span("jira.request", method=method, path=httpx.URL(url).path) as current:
+            while True:
+                current.set("attempts", attempt + 1)
+                if self.limiter:
+                    waited = await self.limiter.acquire(self.limiter_key, self.rate, self.burst)
+                    if waited:
+                        current.set("throttled_ms", round(waited * 1000, 1))
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except httpx.TransportError:
+                    observe_upstream("jira", "transport_error")
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    observe_upstream("jira", response.status_code)
+                    current.set("status", response.status_code)
+                    if self.limiter:
+                        await asyncio.to_thread(self.limiter.observe, self.limiter_key, response.headers)
+                    if response.status_code not in self.RETRY_STATUS_CODES or attempt >= self.max_retries:
+                        return response
+                    delay = retry_after_seconds(response)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    elif self.limiter:
+                        # The limiter holds this and every other worker's calls back
+                        await asyncio.to_thread(self.limiter.block, self.limiter_key, delay)
+                        delay = 0
+                attempt += 1
+                await asyncio.sleep(min(delay, self.backoff_max))
+
+    def _backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+
+    async def get_developer_activity(self, email: str, date: str):
+        """
+        Fetches activity for a developer on a specific date.
+        Returns a dictionary with worklogs, issues, and comments.
+        """
+        activity = await self.get_developer_activity_range(email, date, date)
+        if "error" in activity:
+            return activity
+        return activity[date]
+
+    async def get_developer_activity_range(self, email: str, start_date: str, end_date: str):
+        """
+        Fetches activity for a developer over an inclusive date range with a single
+        (paginated) Jira search. Returns a map of date -> the same dictionary that
+        get_developer_activity returns for that date. Concurrent calls for the
+        same developer and range share one fetch.
+        """
+        return await self.flights.do(
+            (email, start_date, end_date), self._get_developer_activity_range, email, start_date, end_date
+        )
+
+    async def _get_developer_activity_range(self, email: str, start_date: str, end_date: str):
+        if not self.jira_url:
+            return {"error": "JIRA_URL not set", "unconfigured": True}
+
+        dates = date_range(start_date, end_date)
+        stored = await asyncio.to_thread(self.store.get_days, "jira", email, dates) if self.store else {}
+        activity = {
+            date: stored[date]["payload"]
+            for date in dates
+            if date in stored and self.store.is_settled(date, stored[date]["fetched_at"])
+        }
+        todo = [date for date in dates if date not in activity]
+        if self.store:
+            count_cache("activity_jira", hits=len(activity), misses=len(todo))
+        indexing = self.index is not None and self.index.enabled
+        if indexing and todo:
+            indexed = await asyncio.to_thread(self.index.jira_days, email, todo)
+            count_cache("activity_index_jira", hits=len(indexed), misses=len(todo) - len(indexed))
+            activity.update(indexed)
+            todo = [date for date in todo if date not in indexed]
+        if not todo:
+            return {date: activity[date] for date in dates}
+
+        fetched_at = time.time()
+        try:
+            if all(date in stored for date in todo) and not indexing:
+                # Every day we need is on disk, only pull the issues that changed since
+                since = min(stored[date]["fetched_at"] for date in todo)
+                with span("jira.activity", mode="changes", days=len(todo)):
+                    fresh = await self._fetch_changes(
+                        email, todo[0], todo[-1], since, {date: stored[date]["payload"] for date in todo}
+                    )
+            else:
+                with span("jira.activity", mode="range", days=len(todo)):
+                    fresh = await self._fetch_range(email, todo[0], todo[-1])
+        except RateLimitExceeded as e:
+            return {"error": f"Failed to fetch Jira data: {e}", "rate_limited": True}
+        except httpx.HTTPError as e:
+            return {"error": f"Failed to fetch Jira data: {e}"}
+        if "error" in fresh:
+            return fresh
+
+        fresh = {date: fresh[date] for date in todo}
+        if self.store:
+            await asyncio.to_thread(self.store.put_days, "jira", email, fresh, fetched_at=fetched_at)
+        activity.update(fresh)
+        return {date: activity[date] for date in dates}
+
+    async def get_team_activity_range(self, emails: list, project_key: str, start_date: str, end_date: str):
+        """
+        Fetches the activity of several developers in one project with a single
+        (paginated) Jira search. Returns email -> date -> activity dictionary.
+        Results are limited to the project, so they are not written to the store.
+        """
+        if not self.jira_url:
+            return {"error": "JIRA_URL not set", "unconfigured": True}
+
+        authors = ", ".join(f"'{email}'" for email in emails)
+        jql = (
+            f"project = '{project_key}' AND worklogAuthor in ({authors}) "
+            f"AND worklogDate >= '{start_date}' AND worklogDate <= '{end_date}'"
+        )
+        try:
+            with span("jira.team_activity", members=len(emails), project=project_key):
+                issues = await self._search_worklogs(jql, start_date, end_date)
+        except RateLimitExceeded as e:
+            return {"error": f"Failed to fetch Jira data: {e}", "rate_limited": True}
+        except httpx.HTTPError as e:
+            return {"error": f"Failed to fetch Jira data: {e}"}
+        if isinstance(issues, dict):
+            return issues
+
+        return _bucket_worklogs(issues, emails, start_date, end_date)
+
+    async def _fetch_range(self, email: str, start_date: str, end_date: str):
+        jql = (
+            f"worklogAuthor = '{email}' "
+            f"AND worklogDate >= '{start_date}' AND worklogDate <= '{end_date}'"
+        )
+        fetched_at = time.time()
+        issues = await self._search_worklogs(jql, start_date, end_date)
+        if isinstance(issues, dict):
+            return issues
+
+        if self.index is not None and self.index.enabled:
+            await asyncio.to_thread(self.index.reconcile_jira, email, start_date, end_date, issues, fetched_at)
+
+        return _bucket_worklogs(issues, [email], start_date, end_date)[email]
+
+    async def _fetch_changes(self, email: str, start_date: str, end_date: str, since: float, cached: dict):
+        """
+        Re-reads only the issues updated since `since` and merges them into the
+        cached days. Jira compares JQL dates in the server's timezone, so a day
+        of slack is taken off the cut-off. The cached issues are re-read too:
+        once the author's last worklog on one is deleted, worklogAuthor no
+        longer matches it, and it comes back without their worklogs instead.
+        """
+        since_date = (datetime.fromtimestamp(since) - timedelta(days=1)).strftime("%Y-%m-%d")
+        author = f"worklogAuthor = '{email}'"
+        cached_keys = sorted({issue["key"] for day in cached.values() for issue in day["issues"]})
+        if cached_keys:
+            author = f"({author} OR key in ({', '.join(cached_keys)}))"
+        jql = f"{author} AND updated >= '{since_date}'"
+        issues = await self._search_worklogs(jql, start_date, end_date)
+        if isinstance(issues, dict):
+            return issues
+
+        changed_keys = {issue.key for issue in issues}
+        changed = _bucket_worklogs(issues, [email], start_date, end_date)[email]
+        return {
+            date: _merge_changed_issues(cached[date], changed[date], changed_keys)
+            for date in cached
+        }
+
+    async def get_issue(self, issue_id: str):
+        """
+        Fetches an issue's key, summary and status as a JiraIssue.
+        Returns None if the issue cannot be read.
+        """
+        response = await self._request(
+            "GET", f"{self.jira_url}/rest/api/3/issue/{issue_id}", params={"fields": "summary,status"}
+        )
+        if response.status_code != 200:
+            return None
+        return JiraIssue.from_api(loads(response.content))
+
+    async def search_issues(self, jql: str):
+        """
+        Runs a JQL search and follows nextPageToken until every page is read.
+        Returns the list of JiraIssue records, or an error dictionary.
+        """
+        search_url = f"{self.jira_url}/rest/api/3/search/jql"
+        payload = {
+            "jql": jql,
+            "fields": ["summary", "status", "worklog"],
+            "maxResults": 100
+        }
+
+        issues = []
+        while True:
+            response = await self._request("POST", search_url, json=payload)
+
+            if response.status_code != 200:
+                return {"error": f"Failed to fetch Jira data: {response.text}"}
+
+            data = loads(response.content)
+            issues.extend(JiraIssue.from_api(issue) for issue in data.get("issues", []))
+
+            next_page_token = data.get("nextPageToken")
+            if data.get("isLast", True) or not next_page_token:
+                return issues
+            payload["nextPageToken"] = next_page_token
+
+    async def _search_worklogs(self, jql: str, start_date: str, end_date: str):
+        """
+        Runs search_issues() and completes the worklogs of issues where Jira
+        cut the embedded list off (it returns at most 20), reading only the
+        worklogs started around the date range.
+        """
+        issues = await self.search_issues(jql)
+        if isinstance(issues, dict):
+            return issues
+
+        truncated = [issue for issue in issues if issue.worklog_total > len(issue.worklogs)]
+        if not truncated:
+            return issues
+
+        limit = asyncio.Semaphore(self.worklog_concurrency)
+        results = await asyncio.gather(*(
+            self._get_issue_worklogs(limit, issue.key, start_date, end_date) for issue in truncated
+        ))
+        for issue, worklogs in zip(truncated, results):
+            if isinstance(worklogs, dict):
+                return worklogs
+            issue.worklogs = worklogs
+            issue.worklog_total = len(worklogs)
+        return issues
+
+    async def _get_issue_worklogs(self, limit: asyncio.Semaphore, issue_key: str, start_date: str, end_date: str):
+        """
+        Pages through /issue/{key}/worklog for worklogs started in the range.
+        Each page is reduced to JiraWorklog records before the next is
+        requested, so memory stays at one page however many worklogs the
+        issue has. Returns the list of records, or an error dictionary.
+        """
+        url = f"{self.jira_url}/rest/api/3/issue/{issue_key}/worklog"
+        # Bounds are in epoch milliseconds; a day of slack on each side covers
+        # the server timezone, the exact days are picked when bucketing
+        started_after = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=1)
+        started_before = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=2)
+        params = {
+            "startedAfter": int(started_after.timestamp() * 1000),
+            "startedBefore": int(started_before.timestamp() * 1000),
+            "maxResults": self.worklog_page_size,
+            "startAt": 0
+        }
+
+        worklogs = []
+        async with limit:
+            while True:
+                response = await self._request("GET", url, params=params)
+                if response.status_code != 200:
+                    return {"error": f"Failed to fetch Jira worklogs for {issue_key}: {response.text}"}
+
+                data = loads(response.content)
+                page = data.get("worklogs", [])
+                worklogs.extend(JiraWorklog.from_api(worklog) for worklog in page)
+
+                params["startAt"] += len(page)
+                if not page or params["startAt"] >= data.get("total", 0):
+                    return worklogs
+
+def _merge_changed_issues(cached_day: dict, changed_day: dict, changed_keys: set) -> dict:
     """
-    Fetches activity for a developer on a specific date.
-    Returns a dictionary with worklogs, issues, and comments.
+    Replaces the changed issues of a cached day with their fresh versions.
     """
-    jira_url = os.getenv("JIRA_URL")
-    if not jira_url:
-        return {"error": "JIRA_URL not set"}
-    
-    # 1. Search for issues updated by the user on that date
-    jql = f"worklogAuthor = '{email}' AND worklogDate = '{date}'"
-    search_url = f"{jira_url}/rest/api/3/search/jql"
-    
-    payload = {
-        "jql": jql,
-        "fields": ["summary", "status", "worklog"]
+    issues = [issue for issue in cached_day["issues"] if issue["key"] not in changed_keys]
+    issues.extend(changed_day["issues"])
+    return {
+        **cached_day,
+        "issues": issues,
+        "total_time_seconds": sum(issue["time_spent_seconds"] for issue in issues)
     }
 
-    response = requests.post(
-        search_url,
-        headers=get_jira_headers(),
-        auth=get_jira_auth(),
-        json=payload
-    )
-    
-    if response.status_code != 200:
-        return {"error": f"Failed to fetch Jira data: {response.text}"}
-        
-    issues = response.json().get("issues", [])
-    
-    activity_data = {
-        "date": date,
-        "developer": email,
-        "issues": [],
-        "total_time_seconds": 0
+def worklog_comment(worklog: dict) -> Optional[str]:
+    """
+    Returns a worklog's comment as text (ADF or plain string), or None if it
+    has none.
+    """
+    comment = worklog.get("comment")
+    if not comment:
+        return None
+    if isinstance(comment, dict):
+        text = _extract_text_from_adf(comment, ADF_MAX_CHARS)
+        return text if text.strip() else None
+    if isinstance(comment, str):
+        return comment
+    return None
+
+def _bucket_worklogs(issues: list, emails: list, start_date: str, end_date: str):
+    """
+    Buckets the worklogs of the given JiraIssue records by author and day.
+    Returns a map of email -> date -> activity dictionary, with an (empty)
+    entry for every author and every date in the range.
+    """
+    dates = date_range(start_date, end_date)
+    activity = {
+        email: {
+            date: {
+                "date": date,
+                "developer": email,
+                "issues": [],
+                "total_time_seconds": 0
+            }
+            for date in dates
+        }
+        for email in emails
     }
-    
+
     for issue in issues:
-        issue_summary = issue["fields"]["summary"]
-        issue_status = issue["fields"]["status"]["name"]
-        
-        # Filter worklogs for the specific user and date
-        worklogs = issue["fields"].get("worklog", {}).get("worklogs", [])
-        
-        time_spent_seconds = 0
-        comments = []
-        
-        for worklog in worklogs:
-             # Basic check, date format from Jira is usually ISO 8601
-             if date in worklog.get("started", "") and worklog.get("author", {}).get("emailAddress") == email:
-                 time_spent_seconds += worklog.get("timeSpentSeconds", 0)
-                 if "comment" in worklog and worklog["comment"]:
-                     # Extract text from ADF or string
-                     if isinstance(worklog["comment"], dict):
-                         text = _extract_text_from_adf(worklog["comment"])
-                         if text.strip():
-                            comments.append(text)
-                     elif isinstance(worklog["comment"], str):
-                         comments.append(worklog["comment"])
-
-        if time_spent_seconds > 0:
-            activity_data["issues"].append({
-                "key": issue["key"],
-                "summary": issue_summary,
-                "status": issue_status,
-                "time_spent_seconds": time_spent_seconds,
-                "comments": comments
-            })
-            activity_data["total_time_seconds"] += time_spent_seconds
-            
-    return activity_data
+        # (email, date) -> [time_spent_seconds, comments]
+        per_day = {}
+
+        for worklog in issue.worklogs:
+            email = worklog.email
+            # Date format from Jira is ISO 8601, e.g. 2024-01-31T09:00:00.000+0000
+            date = worklog.started[:10]
+            if email not in activity or date not in activity[email]:
+                continue
+
+            bucket = per_day.setdefault((email, date), [0, []])
+            bucket[0] += worklog.seconds
+            if worklog.comment is not None:
+                bucket[1].append(worklog.comment)
+
+        for (email, date), (time_spent_seconds, comments) in per_day.items():
+            if time_spent_seconds > 0:
+                day = activity[email][date]
+                day["issues"].append({
+                    "key": issue.key,
+                    "summary": issue.summary,
+                    "status": issue.status,
+                    "time_spent_seconds": time_spent_seconds,
+                    "comments": comments
+                })
+                day["total_time_seconds"] += time_spent_seconds
+
+    return activity
@@ -0,0 +1,344 @@
+from agent import generate_timesheet_entries, timesheet_config, timesheet_days
+from dates import recent_dates
+from github_client import GitHubClient
+from models import BulkTimesheetRequest
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from fast_json import dumps, loads
+from sqlite_store import connect
+from typing import Optional
+
+logger = logging.getLogger("autum")
+
+class JobStore:
+    """
+    SQLite-backed state for bulk timesheet jobs, so queued and partially
+    finished jobs survive a restart. Each member's entries or error is its
+    own row, so finishing a member is one small write however large the job.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("JOB_STORE_PATH", "jobs.db")
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, "
+                "total INTEGER NOT NULL, completed INTEGER NOT NULL, errors TEXT NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "owner TEXT, lease_until REAL NOT NULL DEFAULT 0)"
+            )
+            # Per-member outcomes
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_members ("
+                "job_id TEXT NOT NULL, email TEXT NOT NULL, entries TEXT, error TEXT, "
+                "PRIMARY KEY (job_id, email))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def create(self, request: dict, total: int, owner: Optional[str] = None, lease: float = 0) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO jobs (id, status, request, total, completed, errors, created_at, updated_at, "
+                "owner, lease_until) VALUES (?, 'queued', ?, ?, 0, '{}', ?, ?, ?, ?)",
+                (job_id, dumps(request), total, now, now, owner, now + lease if owner else 0)
+            )
+            db.commit()
+        return job_id
+
+    def claim(self, job_id: str, owner: str, lease: float) -> bool:
+        """
+        Takes the job for `owner` unless another worker process holds an
+        unexpired lease on it. Only one process can win the claim.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            cursor = db.execute(
+                "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ? AND status IN ('queued', 'running') "
+                "AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+                (owner, now + lease, job_id, owner, now)
+            )
+            db.commit()
+        return cursor.rowcount == 1
+
+    def renew(self, owner: str, lease: float):
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time() + lease, owner)
+            )
+            db.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT id, status, request, total, completed, errors, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            members = db.execute(
+                "SELECT email, entries, error FROM job_members WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        if row is None:
+            return None
+        results, errors = {}, loads(row[5])
+        for email, entries, error in members:
+            if entries is not None:
+                results[email] = loads(entries)
+            if error is not None:
+                errors[email] = error
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "request": loads(row[2]),
+            "total": row[3],
+            "completed": row[4],
+            "results": results,
+            "errors": errors,
+            "created_at": row[6],
+            "updated_at": row[7]
+        }
+
+    def finish_member(self, job_id: str, email: str, entries: Optional[list] = None, error: Optional[str] = None):
+        """
+        Records one member's entries or error. A member retried after an
+        error replaces its row and is not counted twice.
+        """
+        with self._lock:
+            db = self._db()
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO job_members (job_id, email, entries, error) VALUES (?, ?, ?, ?)",
+                (job_id, email, None if entries is None else dumps(entries), error)
+            )
+            if cursor.rowcount == 1:
+                db.execute(
+                    "UPDATE jobs SET completed = completed + 1, updated_at = ? WHERE id = ?", (time.time(), job_id)
+                )
+            else:
+                db.execute(
+                    "UPDATE job_members SET entries = ?, error = ? WHERE job_id = ? AND email = ?",
+                    (None if entries is None else dumps(entries), error, job_id, email)
+                )
+                db.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+            db.commit()
+
+    def update(self, job_id: str, status: str, errors: Optional[dict] = None):
+        """
+        Sets the job status, adding any job-level `errors` (keyed by what
+        failed rather than by member).
+        """
+        with self._lock:
+            db = self._db()
+            if errors:
+                row = db.execute("SELECT errors FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                merged = {**(loads(row[0]) if row else {}), **errors}
+                db.execute(
+                    "UPDATE jobs SET status = ?, errors = ?, updated_at = ? WHERE id = ?",
+                    (status, dumps(merged), time.time(), job_id)
+                )
+            else:
+                db.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+            db.commit()
+
+    def unfinished(self, claimable_by: Optional[str] = None) -> list:
+        """
+        Ids of queued or running jobs; with `claimable_by`, only those that
+        owner could claim now.
+        """
+        query = "SELECT id FROM jobs WHERE status IN ('queued', 'running')"
+        params = ()
+        if claimable_by:
+            query += " AND (owner IS NULL OR owner = ? OR lease_until < ?)"
+            params = (claimable_by, time.time())
+        with self._lock:
+            rows = self._db().execute(query + " ORDER BY created_at", params).fetchall()
+        return [row[0] for row in rows]
+
+class BulkJobRunner:
+    """
+    Runs bulk timesheet jobs on a bounded pool of async workers. Each job makes one
+    Jira range query per project for all of its members, then fetches GitHub and
+    generates entries per member, sharing the app's clients. The concurrency limits
+    passed in are the bulk ones, kept apart from those of interactive requests.
+    """
+    def __init__(self, store: JobStore, jira_client, activity_store, jira_limit: asyncio.Semaphore,
+                 github_limit: asyncio.Semaphore, llm_limit: asyncio.Semaphore, limiter=None, index=None):
+        self.store = store
+        self.jira_client = jira_client
+        self.activity_store = activity_store
+        self.jira_limit = jira_limit
+        self.github_limit = github_limit
+        self.llm_limit = llm_limit
+        self.limiter = limiter
+        self.index = index
+        self.workers = int(os.getenv("BULK_WORKERS", "2"))
+        self.member_concurrency = int(os.getenv("BULK_MEMBER_CONCURRENCY", "8"))
+        # With several server worker processes, each job is leased to one of them;
+        # a lease that is not renewed (crashed process) lets another take over
+        self.owner = uuid.uuid4().hex
+        self.lease = float(os.getenv("BULK_JOB_LEASE", "120"))
+        # Per-request GitHub tokens stay in memory only, never in the job store
+        self._tokens = {}
+        self._queue = None
+        self._queued = set()
+        self._tasks = []
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.workers:
+            # Also picks up anything left over from before a restart
+            self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, request: BulkTimesheetRequest) -> str:
+        # Resolve the dates now so a job resumed after a restart covers the same days
+        payload = {
+            **request.model_dump(exclude={"github_token"}), "dates": recent_dates(request.days),
+            "own_github_token": bool(request.github_token)
+        }
+        job_id = await asyncio.to_thread(
+            self.store.create, payload, total=len(request.members), owner=self.owner, lease=self.lease
+        )
+        if request.github_token:
+            self._tokens[job_id] = request.github_token
+        self._enqueue(job_id)
+        return job_id
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._queued:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _maintain(self):
+        """
+        Renews the leases of this process's jobs and queues jobs whose owner
+        has gone away.
+        """
+        while True:
+            await asyncio.to_thread(self.store.renew, self.owner, self.lease)
+            for job_id in await asyncio.to_thread(self.store.unfinished, claimable_by=self.owner):
+                self._enqueue(job_id)
+            await asyncio.sleep(self.lease / 3)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                if await asyncio.to_thread(self.store.claim, job_id, self.owner, self.lease):
+                    await self._run(job_id)
+            except Exception as e:
+                await asyncio.to_thread(self.store.update, job_id, "failed", {"job": str(e)})
+                self._tokens.pop(job_id, None)
+            finally:
+                self._queued.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            return
+        payload = job["request"]
+        request = BulkTimesheetRequest(**payload)
+        dates = payload["dates"]
+        # Members finished before a restart are kept
+        members = [m for m in request.members if m.jira_email not in job["results"]]
+        await asyncio.to_thread(self.store.update, job_id, "running")
+        if not dates or not members:
+            await self._finish(job_id)
+            return
+
+        token = self._tokens.get(job_id)
+        if payload.get("own_github_token") and token is None:
+            # Queued by a process that has since gone; its token went with it
+            await asyncio.to_thread(self.store.update, job_id, "running", {
+                "github_token": "Resumed without the request's GitHub token; used the server token"
+            })
+
+        # 1. One Jira range query per project covers every member in it
+        projects = {}
+        for member in members:
+            projects.setdefault(member.jira_project_key, set()).add(member.jira_email)
+
+        async def fetch_project(project_key: str, emails: set):
+            async with self.jira_limit:
+                activity = await self.jira_client.get_team_activity_range(
+                    sorted(emails), project_key, dates[-1], dates[0]
+                )
+            if activity.get("unconfigured"):
+                return project_key, {}
+            if "error" in activity:
+                logger.warning("Jira activity for project %s unavailable: %s", project_key, activity["error"])
+                await asyncio.to_thread(
+                    self.store.update, job_id, "running", {f"jira:{project_key}": activity["error"]}
+                )
+            return project_key, activity
+
+        jira_by_project = dict(await asyncio.gather(*(
+            fetch_project(project_key, emails) for project_key, emails in projects.items()
+        )))
+
+        gh_client = GitHubClient(
+            token=token or os.getenv("GITHUB_TOKEN"), store=self.activity_store,
+            limiter=self.limiter, index=self.index
+        )
+        member_limit = asyncio.Semaphore(self.member_concurrency)
+
+        async def run_member(member):
+            async with member_limit:
+                try:
+                    # Missing upstream data fails the member rather than producing "No activity" rows
+                    jira_activity = jira_by_project[member.jira_project_key]
+                    if "error" in jira_activity:
+                        raise RuntimeError(f"Jira activity unavailable: {jira_activity['error']}")
+
+                    # 2. GitHub per member
+                    async with self.github_limit:
+                        github_by_date = await gh_client.get_activity_range(
+                            member.github_username, dates[-1], dates[0]
+                        )
+                    if github_by_date.get("unconfigured"):
+                        github_by_date = {}
+                    elif "error" in github_by_date:
+                        raise RuntimeError(f"GitHub activity unavailable: {github_by_date['error']}")
+
+                    # 3. Entries through the shared LLM client pool
+                    days = timesheet_days(dates, jira_activity.get(member.jira_email, {}), github_by_date)
+                    async with self.llm_limit:
+                        entries = await generate_timesheet_entries(days, timesheet_config(member), request.llm_provider)
+                    await asyncio.to_thread(
+                        self.store.finish_member, job_id, member.jira_email,
+                        entries=[entry.model_dump() for entry in entries]
+                    )
+                except Exception as e:
+                    logger.warning("Bulk job %s: %s failed: %s", job_id, member.jira_email, e)
+                    await asyncio.to_thread(self.store.finish_member, job_id, member.jira_email, error=str(e))
+
+        await asyncio.gather(*(run_member(member) for member in members))
+        await self._finish(job_id)
+
+    async def _finish(self, job_id: str):
+        await asyncio.to_thread(self.store.update, job_id, "completed")
+        self._tokens.pop(job_id, None)
+
+store = JobStore()
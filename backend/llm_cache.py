@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from tracing import count_cache
+from sqlite_store import connect
+from typing import Optional
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache for generated text (summaries, remarks).
+    Keys are a hash of the normalized prompt inputs plus provider and model, so
+    a day whose activity has not changed never needs another LLM call.
+    Entries expire after `ttl` seconds and the least recently used entries are
+    evicted once the cache holds more than `max_entries`. Reads never write:
+    hits are remembered in memory and their access times are saved with the
+    next set(), which is also the only place entries are evicted.
+    """
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = path or os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+        self._lock = threading.Lock()
+        self._conn = None
+        # key -> time of the last hit not yet written to accessed_at
+        self._accessed = {}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(kind: str, provider: str, model: Optional[str], *inputs) -> str:
+        normalized = [" ".join(str(value).split()) for value in inputs]
+        raw = json.dumps([kind, provider, model, normalized], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._db().execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                # Expired entries are deleted by the next set()
+                count_cache("llm", misses=1)
+                return None
+            self._accessed[key] = now
+            count_cache("llm", hits=1)
+            return row[0]
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if self._accessed:
+                db.executemany(
+                    "UPDATE llm_cache SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                    [(accessed_at, accessed_key) for accessed_key, accessed_at in self._accessed.items()]
+                )
+                self._accessed.clear()
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        db.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        (count,) = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+cache = LLMCache()
@@ -0,0 +1,464 @@
+from langchain_openai import ChatOpenAI, AzureChatOpenAI
+from prompt_builder import count_tokens
+from tracing import CIRCUITS_OPEN, LLM_SECONDS, LLM_PROMPT_TOKENS, LLM_ROUTING, add_collector, record_span
+from collections import deque
+import asyncio
+import openai
+import os
+import threading
+import time
+from typing import Optional
+
+SUPPORTED_PROVIDERS = ("azure", "grok", "openai")
+
+class LLMConfigError(Exception):
+    """
+    Raised when a provider is unknown or its credentials are not configured.
+    """
+
+class CircuitOpenError(Exception):
+    """
+    Raised when every provider on a route has its circuit breaker open.
+    """
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive retryable errors and rejects calls for
+    `cooldown` seconds; then lets one trial call through (half-open), closing
+    again on success and re-opening on failure.
+    """
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_running or self.consecutive_failures >= self.failures:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def release(self):
+        """
+        Frees the half-open trial slot of a call that was cancelled before
+        it succeeded or failed, without counting it either way.
+        """
+        with self._lock:
+            self.trial_running = False
+
+class ProviderStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+        self.last_error = None
+        self.last_ok = None
+        self.prompt_tokens = 0
+        self.last_prompt_tokens = None
+        # Latencies of recent successful calls, for the hedging deadline
+        self.recent_latencies = deque(maxlen=200)
+
+    def p95_latency(self) -> Optional[float]:
+        if not self.recent_latencies:
+            return None
+        latencies = sorted(self.recent_latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+    def as_dict(self) -> dict:
+        p95 = self.p95_latency()
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 1) if self.calls else None,
+            "last_latency_ms": round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "last_error": self.last_error,
+            "prompt_tokens": self.prompt_tokens,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.calls) if self.calls else None,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            # Healthy until proven otherwise; unhealthy once the last call failed
+            "healthy": self.last_ok is not False
+        }
+
+class LLMRegistry:
+    """
+    Builds each LLM client once per (provider, model, temperature) and reuses it,
+    so the underlying HTTP connection pool survives across requests.
+    Calls are routed along LLM_PROVIDER_ORDER: on 429/5xx/timeouts the next
+    configured provider is tried, each provider has a circuit breaker, and with
+    LLM_HEDGE enabled a backup request is sent if the first one is slower than
+    its provider's recent p95.
+    """
+    def __init__(self):
+        self._clients = {}
+        self._stats = {provider: ProviderStats() for provider in SUPPORTED_PROVIDERS}
+        self._lock = threading.Lock()
+        self.provider_order = [
+            provider.strip().lower()
+            for provider in os.getenv("LLM_PROVIDER_ORDER", "").split(",")
+            if provider.strip()
+        ]
+        self.hedge = os.getenv("LLM_HEDGE", "false").lower() == "true"
+        self.hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+        self.hedge_min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        # Upper bound on one LLM call (or the wait for one streamed chunk)
+        self.call_timeout = float(os.getenv("LLM_TIMEOUT") or "60")
+        self._breakers = {}
+        add_collector(self._collect_circuits)
+
+    def resolve_provider(self, llm_provider: Optional[str] = None) -> str:
+        return (llm_provider or os.getenv("LLM_PROVIDER", "openai")).lower()
+
+    def default_model(self, provider: str) -> Optional[str]:
+        if provider == "azure":
+            return os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+        if provider == "grok":
+            return os.getenv("GROK_MODEL", "grok-4-latest")
+        if provider == "openai":
+            return os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        return None
+
+    def route(self, llm_provider: Optional[str] = None) -> list:
+        """
+        Returns the configured providers to try, the requested one first and
+        then the rest of LLM_PROVIDER_ORDER. Raises LLMConfigError if none of
+        them can be used.
+        """
+        primary = self.resolve_provider(llm_provider)
+        routes = []
+        error = None
+        for provider in [primary] + self.provider_order:
+            if provider in routes:
+                continue
+            try:
+                self.get_llm(provider)
+            except LLMConfigError as e:
+                error = error or e
+                continue
+            routes.append(provider)
+        if not routes:
+            raise error
+        return routes
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(provider)
+            if breaker is None:
+                breaker = self._breakers[provider] = CircuitBreaker(
+                    int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                    float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+                )
+            return breaker
+
+    def _collect_circuits(self):
+        with self._lock:
+            breakers = list(self._breakers.items())
+        for provider, breaker in breakers:
+            CIRCUITS_OPEN.set(0 if breaker.state == "closed" else 1, provider=provider)
+
+    def _hedge_deadline(self, provider: str) -> float:
+        with self._lock:
+            stats = self._stats.setdefault(provider, ProviderStats())
+            if len(stats.recent_latencies) < self.hedge_min_samples:
+                return self.hedge_delay
+            return stats.p95_latency()
+
+    def get_llm(self, provider: str, model: Optional[str] = None, temperature: float = 0.7):
+        """
+        Returns the shared client for the provider, building it on first use.
+        Raises LLMConfigError if the provider cannot be used.
+        """
+        model = model or self.default_model(provider)
+        key = (provider, model, temperature)
+        llm = self._clients.get(key)
+        if llm is not None:
+            return llm
+
+        with self._lock:
+            llm = self._clients.get(key)
+            if llm is None:
+                llm = self._build(provider, model, temperature)
+                self._clients[key] = llm
+        return llm
+
+    def _build(self, provider: str, model: Optional[str], temperature: float):
+        if provider == "azure":
+            api_key = os.getenv("AZURE_OPENAI_API_KEY")
+            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+            if not api_key or not endpoint:
+                raise LLMConfigError("Azure OpenAI credentials not set.")
+
+            return AzureChatOpenAI(
+                api_key=api_key,
+                azure_endpoint=endpoint,
+                azure_deployment=model,
+                api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+                temperature=temperature,
+                **_client_options()
+            )
+
+        if provider == "grok":
+            api_key = os.getenv("GROK_API_KEY")
+            if not api_key:
+                raise LLMConfigError("Grok API Key not set.")
+
+            # Grok is compatible with OpenAI's API structure
+            return ChatOpenAI(
+                openai_api_key=api_key,
+                openai_api_base="https://api.x.ai/v1",
+                model_name=model,
+                temperature=temperature,
+                **_client_options()
+            )
+
+        if provider == "openai":
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise LLMConfigError("OpenAI API Key not set.")
+
+            return ChatOpenAI(temperature=temperature, model_name=model, openai_api_key=api_key, **_client_options())
+
+        raise LLMConfigError(f"Unsupported LLM Provider: {provider}")
+
+    async def ainvoke(self, provider: str, messages: list, model: Optional[str] = None, temperature: float = 0.7):
+        """
+        Invokes the provider, failing over along the route on retryable errors
+        (including the per-call LLM_TIMEOUT) and hedging to the next provider
+        when enabled. `model` only applies to the requested provider; fallbacks
+        use their default model.
+        """
+        routes = self.route(provider)
+        if not self.hedge or len(routes) < 2:
+            error = None
+            for candidate in routes:
+                if not self.breaker(candidate).allow():
+                    LLM_ROUTING.inc(provider=candidate, event="circuit_open")
+                    continue
+                try:
+                    return await self._ainvoke_one(
+                        candidate, messages, model if candidate == routes[0] else None, temperature
+                    )
+                except Exception as e:
+                    if not _is_retryable(e):
+                        raise
+                    error = e
+                    LLM_ROUTING.inc(provider=candidate, event="failover")
+            raise error or CircuitOpenError(f"All LLM providers unavailable: {', '.join(routes)}")
+        return await self._ainvoke_hedged(routes, messages, model, temperature)
+
+    async def _ainvoke_hedged(self, routes: list, messages: list, model: Optional[str], temperature: float):
+        """
+        Keeps at most two requests in flight: the next provider is started when
+        the current one fails with a retryable error or outlives its hedging
+        deadline. The first successful response wins and the other request is
+        cancelled.
+        """
+        remaining = list(routes)
+        pending = {}
+        error = None
+
+        def launch():
+            while remaining:
+                candidate = remaining.pop(0)
+                if not self.breaker(candidate).allow():
+                    LLM_ROUTING.inc(provider=candidate, event="circuit_open")
+                    continue
+                task = asyncio.create_task(self._ainvoke_one(
+                    candidate, messages, model if candidate == routes[0] else None, temperature
+                ))
+                pending[task] = candidate
+                return
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if remaining and len(pending) == 1:
+                    timeout = self._hedge_deadline(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    LLM_ROUTING.inc(provider=next(iter(pending.values())), event="hedge")
+                    launch()
+                    continue
+                for task in done:
+                    candidate = pending.pop(task)
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        if not _is_retryable(e) and not pending:
+                            raise
+                        error = e
+                        LLM_ROUTING.inc(provider=candidate, event="failover")
+                if not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error or CircuitOpenError(f"All LLM providers unavailable: {', '.join(routes)}")
+
+    async def _ainvoke_one(self, provider: str, messages: list, model: Optional[str], temperature: float):
+        llm = self.get_llm(provider, model, temperature)
+        tokens = _prompt_tokens(messages)
+        start = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(llm.ainvoke(messages), self.call_timeout)
+        except asyncio.CancelledError:
+            # Lost a hedge race or the client went away; not the provider's fault
+            self.breaker(provider).release()
+            raise
+        except Exception as e:
+            self.record(provider, time.perf_counter() - start, e, tokens)
+            raise
+        self.record(provider, time.perf_counter() - start, prompt_tokens=tokens)
+        return response
+
+    async def astream(self, provider: str, messages: list, model: Optional[str] = None, temperature: float = 0.7):
+        """
+        Streams message chunks, recording the full completion latency and
+        errors like ainvoke(). LLM_TIMEOUT bounds the wait for each chunk. Fails
+        over to the next provider only if the error comes before the first
+        chunk; streams are not hedged.
+        """
+        routes = self.route(provider)
+        error = None
+        for candidate in routes:
+            if not self.breaker(candidate).allow():
+                LLM_ROUTING.inc(provider=candidate, event="circuit_open")
+                continue
+            llm = self.get_llm(candidate, model if candidate == routes[0] else None, temperature)
+            tokens = _prompt_tokens(messages)
+            started = False
+            start = time.perf_counter()
+            recorded = False
+            chunks = llm.astream(messages).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.call_timeout)
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    yield chunk
+                recorded = True
+                self.record(candidate, time.perf_counter() - start, prompt_tokens=tokens)
+                return
+            except Exception as e:
+                recorded = True
+                self.record(candidate, time.perf_counter() - start, e, tokens)
+                if started or not _is_retryable(e):
+                    raise
+                error = e
+                LLM_ROUTING.inc(provider=candidate, event="failover")
+            finally:
+                # Cancelled, or the consumer closed the stream (GeneratorExit)
+                if not recorded:
+                    self.breaker(candidate).release()
+                await chunks.aclose()
+        raise error or CircuitOpenError(f"All LLM providers unavailable: {', '.join(routes)}")
+
+    async def abatch(self, provider: str, messages_list: list, max_concurrency: Optional[int] = None,
+                     model: Optional[str] = None, temperature: float = 0.7) -> list:
+        """
+        Runs several prompts through ainvoke() with bounded concurrency, so each
+        gets its own timeout, failover and hedging. Failed prompts come back as
+        exceptions in their slot instead of raising.
+        """
+        limit = asyncio.Semaphore(max_concurrency or max(len(messages_list), 1))
+
+        async def run(messages):
+            async with limit:
+                return await self.ainvoke(provider, messages, model, temperature)
+
+        return await asyncio.gather(*(run(messages) for messages in messages_list), return_exceptions=True)
+
+    def record(self, provider: str, latency: float, error: Optional[Exception] = None,
+               prompt_tokens: Optional[int] = None):
+        LLM_SECONDS.observe(latency, provider=provider, outcome="error" if error is not None else "ok")
+        if prompt_tokens is not None:
+            LLM_PROMPT_TOKENS.inc(prompt_tokens, provider=provider)
+        record_span("llm.invoke", latency, error, provider=provider, prompt_tokens=prompt_tokens)
+        with self._lock:
+            stats = self._stats.setdefault(provider, ProviderStats())
+            stats.calls += 1
+            if prompt_tokens is not None:
+                stats.prompt_tokens += prompt_tokens
+                stats.last_prompt_tokens = prompt_tokens
+            stats.total_latency += latency
+            stats.last_latency = latency
+            if error is not None:
+                stats.errors += 1
+                stats.last_error = str(error)[:200]
+                stats.last_ok = False
+            else:
+                stats.last_ok = True
+                stats.recent_latencies.append(latency)
+        # Only provider-side trouble counts against the breaker; a rejected
+        # request still shows the provider is up
+        if error is not None and _is_retryable(error):
+            self.breaker(provider).failure()
+        else:
+            self.breaker(provider).success()
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = {}
+            for provider, model, temperature in self._clients:
+                clients.setdefault(provider, []).append({"model": model, "temperature": temperature})
+            stats = {
+                provider: {**stats.as_dict(), "clients": clients.get(provider, [])}
+                for provider, stats in self._stats.items()
+            }
+        for provider in stats:
+            stats[provider]["circuit"] = self.breaker(provider).state
+        return stats
+
+def _client_options() -> dict:
+    # A short timeout lets a stuck provider fail over instead of holding the request
+    return {
+        "max_retries": int(os.getenv("LLM_MAX_RETRIES", "2")),
+        "timeout": float(os.getenv("LLM_TIMEOUT") or "60")
+    }
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    True for errors another provider might not have: rate limits, server
+    errors, timeouts and connection failures.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (openai.APIConnectionError, TimeoutError))
+
+def _prompt_tokens(messages: list) -> int:
+    return sum(count_tokens(message.content) for message in messages if isinstance(message.content, str))
+
+registry = LLMRegistry()
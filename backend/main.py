@@ -1,17 +1,85 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from models import DailyActivityRequest, ActivitySummary, ChatRequest, TimesheetRequest, TimesheetEntry
-from jira_client import get_developer_activity
-from agent import summarize_activity, generate_timesheet_entry
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from models import (
+    DailyActivityRequest, ActivitySummary, ChatRequest, TimesheetRequest, TimesheetEntry,
+    BulkTimesheetRequest, BulkJobStatus
+)
+from jira_client import JiraClient
+from agent import (
+    summarize_activity, stream_summary, generate_timesheet_entries, iter_timesheet_entries,
+    timesheet_config, timesheet_days
+)
 from github_client import GitHubClient
-from datetime import datetime, timedelta
+from llm_registry import registry as llm_registry
+from activity_store import store as activity_store
+from activity_index import index as activity_index, signature_valid
+from upstream_state import limiter
+from dates import recent_dates
+from jobs import BulkJobRunner, store as job_store
+from prewarm import PrewarmScheduler, store as prewarm_store
+from prompt_builder import load_encoding
+from tracing import TracingMiddleware, publish_metrics, render_metrics, span
+from fast_json import dumps, loads
 from typing import List
+from contextlib import asynccontextmanager
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="Autum - Developer Avatar API")
+logger = logging.getLogger("autum")
+
+# One JSON line per request with its stage timings, upstream statuses and cache hits
+if os.getenv("TRACE_LOG", "false").lower() == "true":
+    trace_handler = logging.StreamHandler()
+    trace_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger("autum.trace").addHandler(trace_handler)
+    logging.getLogger("autum.trace").setLevel(logging.INFO)
+
+# Per-source concurrency limits, shared across all requests so we stay
+# under each upstream's rate limits.
+jira_limit = asyncio.Semaphore(int(os.getenv("JIRA_CONCURRENCY", "4")))
+github_limit = asyncio.Semaphore(int(os.getenv("GITHUB_CONCURRENCY", "4")))
+llm_limit = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY", "4")))
+# Bulk jobs and pre-warming draw from their own limits, so a large batch
+# cannot hold every slot while interactive requests wait behind it
+bulk_jira_limit = asyncio.Semaphore(int(os.getenv("BULK_JIRA_CONCURRENCY", "2")))
+bulk_github_limit = asyncio.Semaphore(int(os.getenv("BULK_GITHUB_CONCURRENCY", "2")))
+bulk_llm_limit = asyncio.Semaphore(int(os.getenv("BULK_LLM_CONCURRENCY", "2")))
+
+# Days per LLM call on the streaming endpoint; smaller batches mean an earlier first row
+STREAM_BATCH_SIZE = int(os.getenv("LLM_STREAM_BATCH_SIZE", "1"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Token counting needs the tiktoken encoding, which may have to be downloaded first
+    await load_encoding(float(os.getenv("TIKTOKEN_LOAD_TIMEOUT", "10")))
+    # Shared, pooled upstream clients live for the lifetime of the app
+    app.state.jira_client = JiraClient(store=activity_store, limiter=limiter, index=activity_index)
+    app.state.bulk_jobs = BulkJobRunner(
+        job_store, app.state.jira_client, activity_store, bulk_jira_limit, bulk_github_limit, bulk_llm_limit,
+        limiter=limiter, index=activity_index
+    )
+    # Off-peak warming of the activity store and LLM cache for the roster
+    app.state.prewarm = PrewarmScheduler(
+        prewarm_store, app.state.jira_client, activity_store, bulk_jira_limit, bulk_github_limit, bulk_llm_limit,
+        limiter=limiter, index=activity_index
+    )
+    await app.state.bulk_jobs.start()
+    await app.state.prewarm.start()
+    # Each worker shares its metrics so that /metrics on any of them covers the server
+    metrics_task = asyncio.create_task(publish_metrics(float(os.getenv("METRICS_PUBLISH_INTERVAL", "10"))))
+    yield
+    await app.state.prewarm.stop()
+    await app.state.bulk_jobs.stop()
+    await app.state.jira_client.aclose()
+    metrics_task.cancel()
+    await asyncio.gather(metrics_task, return_exceptions=True)
+
+app = FastAPI(title="Autum - Developer Avatar API", lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -25,69 +93,240 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# Outermost, so the trace covers CORS handling and the whole streamed body
+app.add_middleware(TracingMiddleware)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Autum API"}
 
+@app.get("/llm/stats")
+def get_llm_stats(response: Response):
+    # Per-provider health, latency and cached clients, as seen by the worker that
+    # answers (named in X-Worker-PID); /metrics has the figures for all workers
+    response.headers["X-Worker-PID"] = str(os.getpid())
+    return llm_registry.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # Prometheus scrape endpoint: per-stage and per-provider latency histograms,
+    # summed over every server worker
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.post("/activity/summary", response_model=ActivitySummary)
 async def get_activity_summary(request: DailyActivityRequest):
     try:
         # Fetch data from Jira
-        jira_data = get_developer_activity(request.developer_email, request.date)
+        jira_data = await app.state.jira_client.get_developer_activity(request.developer_email, request.date)
         
         # Process with LangChain Agent
-        summary = summarize_activity(jira_data, request.llm_provider)
+        with span("summary.generate"):
+            summary = await summarize_activity(jira_data, request.llm_provider)
         
         return summary
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/activity/summary/stream")
+async def get_activity_summary_stream(request: DailyActivityRequest):
+    """
+    Streams the summary as NDJSON: a "details" event with the Jira figures, "token"
+    events as the LLM writes, and a trailing "summary" event carrying the status.
+    """
+    async def events():
+        try:
+            jira_data = await app.state.jira_client.get_developer_activity(request.developer_email, request.date)
+            async for event in stream_summary(jira_data, request.llm_provider):
+                yield _ndjson(event)
+        except Exception as e:
+            yield _ndjson({"event": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.post("/timesheet/generate", response_model=List[TimesheetEntry])
 async def generate_timesheet(request: TimesheetRequest):
     try:
-        # Calculate dates
-        dates = []
-        today = datetime.now()
-        for i in range(request.days):
-            date_obj = today - timedelta(days=i)
-            # Skip defaults if needed, but for now simple range
-            dates.append(date_obj.strftime("%Y-%m-%d"))
+        dates = recent_dates(request.days)
+        if not dates:
+            return []
         
         # Initialize GitHub Client
-        gh_client = GitHubClient(token=request.github_token or os.getenv("GITHUB_TOKEN"))
-        
-        results = []
-        for date in dates:
-            # 1. Fetch Jira Data
-            jira_data = get_developer_activity(request.jira_email, date)
-            if "error" in jira_data:
-                jira_data = {} # Handle gracefully
-            
-            # 2. Fetch GitHub Data
-            github_data = await gh_client.get_activity(request.github_username, date)
-            if github_data and "error" in github_data[0]:
-                github_data = [] # Handle gracefully
-            
-            # 3. Generate Entry
-            config = {
-                "jira_project_key": request.jira_project_key,
-                "billable": request.billable,
-                "role": request.role,
-                "site": request.site,
-                "authorized_hours": request.authorized_hours
-            }
-            
-            entry = generate_timesheet_entry(jira_data, github_data, date, config, request.llm_provider)
-            results.append(entry)
-            
+        gh_client = GitHubClient(
+            token=request.github_token or os.getenv("GITHUB_TOKEN"), store=activity_store, limiter=limiter,
+            index=activity_index
+        )
+
+        # 1 & 2. Fetch Jira and GitHub Data for the whole range, side by side
+        jira_by_date, github_by_date = await asyncio.gather(
+            _fetch_jira_range(request.jira_email, dates[-1], dates[0]),
+            _fetch_github_range(gh_client, request.github_username, dates[-1], dates[0]),
+        )
+        days = timesheet_days(dates, jira_by_date, github_by_date)
+
+        # 3. Generate Entries, batching the LLM remarks across days
+        async with llm_limit:
+            with span("timesheet.generate", days=len(days)):
+                results = await generate_timesheet_entries(days, timesheet_config(request), request.llm_provider)
         return results
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/timesheet/generate/stream")
+async def generate_timesheet_stream(request: TimesheetRequest):
+    """
+    Streams the timesheet as NDJSON: "progress" events while data is fetched, one
+    "entry" event per day as soon as its remark is ready, then "done".
+    """
+    async def events():
+        try:
+            dates = recent_dates(request.days)
+            yield _ndjson({"event": "progress", "stage": "started", "days": len(dates)})
+
+            if not dates:
+                yield _ndjson({"event": "done"})
+                return
+
+            gh_client = GitHubClient(
+                token=request.github_token or os.getenv("GITHUB_TOKEN"), store=activity_store, limiter=limiter,
+                index=activity_index
+            )
+            jira_task = asyncio.create_task(_fetch_jira_range(request.jira_email, dates[-1], dates[0]))
+            github_task = asyncio.create_task(
+                _fetch_github_range(gh_client, request.github_username, dates[-1], dates[0])
+            )
+            stages = {jira_task: "jira fetched", github_task: "github fetched"}
+
+            pending = set(stages)
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result() # An unavailable upstream ends the stream with an error event
+                        yield _ndjson({"event": "progress", "stage": stages[task]})
+            finally:
+                for task in pending:
+                    task.cancel()
+
+            days = timesheet_days(dates, jira_task.result(), github_task.result())
+            # The LLM slot is held for the generation only, not while a slow client reads
+            entries = iter_timesheet_entries(
+                days, timesheet_config(request), request.llm_provider, batch_size=STREAM_BATCH_SIZE,
+                llm_limit=llm_limit
+            )
+            try:
+                async for index, entry in entries:
+                    yield _ndjson({"event": "entry", "index": index, "entry": entry.model_dump()})
+            finally:
+                # Cancels the LLM calls still running if the client went away
+                await entries.aclose()
+
+            yield _ndjson({"event": "progress", "stage": "llm done"})
+            yield _ndjson({"event": "done"})
+        except HTTPException as e:
+            yield _ndjson({"event": "error", "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            yield _ndjson({"event": "error", "detail": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/timesheet/jobs", status_code=202)
+async def create_timesheet_job(request: BulkTimesheetRequest):
+    # Queued for the background worker pool; poll GET /timesheet/jobs/{job_id}
+    job_id = await app.state.bulk_jobs.submit(request)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/timesheet/jobs/{job_id}", response_model=BulkJobStatus)
+async def get_timesheet_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/prewarm/status")
+def get_prewarm_status():
+    # Schedule and progress of the latest pre-warm runs, from any worker process
+    return app.state.prewarm.status()
+
+@app.post("/webhooks/jira")
+async def jira_webhook(request: Request, background_tasks: BackgroundTasks):
+    """
+    Ingests Jira worklog and issue webhooks into the activity index.
+    """
+    payload = await _webhook_payload(request, os.getenv("JIRA_WEBHOOK_SECRET"), "X-Hub-Signature")
+    result = await asyncio.to_thread(activity_index.ingest_jira, payload)
+    if "unknown_issue" in result:
+        # Worklog deliveries only carry the issue id; look the issue up after replying
+        background_tasks.add_task(_resolve_jira_issue, result["unknown_issue"])
+    return result
+
+@app.post("/webhooks/github")
+async def github_webhook(request: Request):
+    """
+    Ingests GitHub push, pull_request, create and repository webhooks into the activity index.
+    """
+    payload = await _webhook_payload(request, os.getenv("GITHUB_WEBHOOK_SECRET"), "X-Hub-Signature-256")
+    return await asyncio.to_thread(activity_index.ingest_github, request.headers.get("X-GitHub-Event", ""), payload)
+
+async def _webhook_payload(request: Request, secret: str, signature_header: str) -> dict:
+    if not activity_index.enabled:
+        raise HTTPException(status_code=404, detail="Webhook ingestion is disabled")
+    if not secret:
+        # Unsigned deliveries could write anyone's activity into covered days
+        raise HTTPException(status_code=401, detail="Webhook secret is not configured")
+    body = await request.body()
+    if not signature_valid(secret, body, request.headers.get(signature_header)):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    try:
+        return loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body is not JSON")
+
+async def _resolve_jira_issue(issue_id: str):
+    try:
+        issue = await app.state.jira_client.get_issue(issue_id)
+    except Exception as e:
+        logger.warning("Jira issue %s from a worklog webhook could not be looked up: %s", issue_id, e)
+        return
+    if issue is not None:
+        await asyncio.to_thread(activity_index.put_jira_issue, issue)
+
+def _ndjson(event: dict) -> str:
+    return dumps(event) + "\n"
+
+async def _fetch_jira_range(email: str, start_date: str, end_date: str) -> dict:
+    async with jira_limit:
+        jira_data = await app.state.jira_client.get_developer_activity_range(email, start_date, end_date)
+    if jira_data.get("unconfigured"):
+        return {}
+    if "error" in jira_data:
+        logger.warning("Jira activity for %s unavailable: %s", email, jira_data["error"])
+        raise _upstream_error(jira_data)
+    return jira_data
+
+async def _fetch_github_range(gh_client: GitHubClient, username: str, start_date: str, end_date: str) -> dict:
+    async with github_limit:
+        github_data = await gh_client.get_activity_range(username, start_date, end_date)
+    if github_data.get("unconfigured"):
+        return {}
+    if "error" in github_data:
+        logger.warning("GitHub activity for %s unavailable: %s", username, github_data["error"])
+        raise _upstream_error(github_data)
+    return github_data
+
+def _upstream_error(activity: dict) -> HTTPException:
+    # A timesheet of "No activity" days would look valid, so fail the request instead. A source
+    # that is not set up at all ("unconfigured", e.g. no GitHub token) just has no data.
+    return HTTPException(status_code=429 if activity.get("rate_limited") else 503, detail=activity["error"])
+
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Production runs several workers through gunicorn (see gunicorn.conf.py);
+    # this path is for development, with WEB_CONCURRENCY > 1 as a gunicorn-free option
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
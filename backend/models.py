@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class DailyActivityRequest(BaseModel):
     developer_email: str
@@ -19,6 +19,7 @@ class ActivitySummary(BaseModel):
     details: List[IssueDetail] = []
     summary: str
     status: str
+    cached: bool = False
 
 class ChatRequest(BaseModel):
     message: str
@@ -35,6 +36,7 @@ class TimesheetEntry(BaseModel):
     billable: str
     role: str
     site: str
+    cached: bool = False
 
 class TimesheetRequest(BaseModel):
     jira_email: str
@@ -49,3 +51,34 @@ class TimesheetRequest(BaseModel):
     site: str = "Offshore"
     authorized_hours: str = "8"
     llm_provider: str = "azure"
+
+class TeamMember(BaseModel):
+    jira_email: str
+    jira_project_key: str
+    github_username: str
+    employee_id: str
+    employee_name: str
+    billable: str = "Yes"
+    role: str = "Developer"
+    site: str = "Offshore"
+    authorized_hours: str = "8"
+
+class RosterMember(TeamMember):
+    # The provider the developer's requests use; cached text is per provider
+    llm_provider: str = "azure"
+
+class BulkTimesheetRequest(BaseModel):
+    members: List[TeamMember]
+    github_token: Optional[str] = None
+    days: int = 5
+    llm_provider: str = "azure"
+
+class BulkJobStatus(BaseModel):
+    job_id: str
+    status: str  # queued, running, completed, failed
+    total: int
+    completed: int
+    created_at: float
+    updated_at: float
+    results: Dict[str, List[TimesheetEntry]] = {}  # keyed by jira_email
+    errors: Dict[str, str] = {}
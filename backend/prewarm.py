@@ -0,0 +1,263 @@
+from agent import summarize_activity, generate_timesheet_entries, timesheet_config, timesheet_days
+from github_client import GitHubClient
+from models import RosterMember
+from tracing import span
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from fast_json import dumps, loads
+from sqlite_store import connect
+from typing import Optional
+
+logger = logging.getLogger("autum")
+
+class PrewarmStore:
+    """
+    SQLite record of pre-warm runs, shared by the server worker processes:
+    each scheduled run is claimed by exactly one of them and any of them can
+    report on it. The owner holds a lease on a running run; a run whose lease
+    ran out (its worker was recycled or crashed) is marked failed.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("PREWARM_STORE_PATH", "prewarm.db")
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prewarm_runs ("
+                "id TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL, dates TEXT NOT NULL, "
+                "total INTEGER NOT NULL, completed INTEGER NOT NULL, errors TEXT NOT NULL, "
+                "started_at REAL NOT NULL, updated_at REAL NOT NULL, lease_until REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def claim(self, run_id: str, owner: str, dates: list, total: int, lease: float) -> bool:
+        """
+        Starts the run for `owner` unless another process already has.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            self._expire(db, now)
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO prewarm_runs "
+                "(id, owner, status, dates, total, completed, errors, started_at, updated_at, lease_until) "
+                "VALUES (?, ?, 'running', ?, ?, 0, '{}', ?, ?, ?)",
+                (run_id, owner, dumps(dates), total, now, now, now + lease)
+            )
+            db.commit()
+        return cursor.rowcount == 1
+
+    def renew(self, run_id: str, lease: float):
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "UPDATE prewarm_runs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                (time.time() + lease, run_id)
+            )
+            db.commit()
+
+    def update(self, run_id: str, status: str, completed: int, errors: dict):
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "UPDATE prewarm_runs SET status = ?, completed = ?, errors = ?, updated_at = ? WHERE id = ?",
+                (status, completed, dumps(errors), time.time(), run_id)
+            )
+            db.commit()
+
+    def recent(self, limit: int = 5) -> list:
+        with self._lock:
+            db = self._db()
+            self._expire(db, time.time())
+            db.commit()
+            rows = db.execute(
+                "SELECT id, status, dates, total, completed, errors, started_at, updated_at "
+                "FROM prewarm_runs ORDER BY started_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {
+                "run_id": run_id, "status": status, "dates": loads(dates), "total": total,
+                "completed": completed, "errors": loads(errors),
+                "started_at": started_at, "updated_at": updated_at
+            }
+            for run_id, status, dates, total, completed, errors, started_at, updated_at in rows
+        ]
+
+    def _expire(self, db: sqlite3.Connection, now: float):
+        db.execute("UPDATE prewarm_runs SET status = 'failed' WHERE status = 'running' AND lease_until < ?", (now,))
+
+class PrewarmScheduler:
+    """
+    Background task that, at the PREWARM_AT times (off-peak, local time),
+    works through the PREWARM_ROSTER developers and fetches their previous
+    PREWARM_DAYS days of activity, then generates the standup summaries and
+    timesheet remarks for them. It goes through the same clients and agent
+    functions as the API, so the activity store, webhook index and LLM cache
+    are warm when people open the dashboard.
+
+    Developers start at a random offset within PREWARM_JITTER seconds and at
+    most PREWARM_CONCURRENCY are warmed at once, within the upstream and LLM
+    limits it shares with bulk jobs.
+    """
+    def __init__(self, store: PrewarmStore, jira_client, activity_store, jira_limit: asyncio.Semaphore,
+                 github_limit: asyncio.Semaphore, llm_limit: asyncio.Semaphore, limiter=None, index=None):
+        self.store = store
+        self.jira_client = jira_client
+        self.activity_store = activity_store
+        self.jira_limit = jira_limit
+        self.github_limit = github_limit
+        self.llm_limit = llm_limit
+        self.limiter = limiter
+        self.index = index
+        self.enabled = os.getenv("PREWARM_ENABLED", "false").lower() == "true"
+        self.roster_path = os.getenv("PREWARM_ROSTER", "roster.json")
+        self.times = _parse_times(os.getenv("PREWARM_AT", "05:00"))
+        self.days = int(os.getenv("PREWARM_DAYS", "1"))
+        self.jitter = float(os.getenv("PREWARM_JITTER", "300"))
+        self.concurrency = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+        self.lease = float(os.getenv("PREWARM_LEASE", "120"))
+        self.owner = uuid.uuid4().hex
+        self.next_run_at = None
+        self._task = None
+
+    async def start(self):
+        if self.enabled and self.times:
+            self._task = asyncio.create_task(self._schedule())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def roster(self) -> list:
+        """
+        Reads the roster (a JSON list of RosterMember objects) on every run,
+        so edits need no restart.
+        """
+        try:
+            with open(self.roster_path) as f:
+                return [RosterMember(**member) for member in loads(f.read())]
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Pre-warm roster %s unreadable: %s", self.roster_path, e)
+            return []
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "schedule": [f"{hour:02d}:{minute:02d}" for hour, minute in self.times],
+            "days": self.days,
+            "next_run_at": self.next_run_at,
+            "runs": self.store.recent()
+        }
+
+    async def _schedule(self):
+        while True:
+            run_at = _next_run(datetime.now(), self.times)
+            self.next_run_at = run_at.timestamp()
+            await asyncio.sleep(max(0.0, run_at.timestamp() - time.time()))
+            try:
+                await self.run(run_at.strftime("%Y-%m-%d %H:%M"))
+            except Exception:
+                logger.exception("Pre-warm run failed")
+
+    async def run(self, run_id: str) -> bool:
+        """
+        Warms every roster developer once. Returns False if the roster is
+        empty or another worker process has already taken this run.
+        """
+        members = self.roster()
+        # The days before today, most recent first like recent_dates()
+        today = datetime.now()
+        dates = [(today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(1, self.days + 1)]
+        if not members or not dates or not await asyncio.to_thread(
+            self.store.claim, run_id, self.owner, dates, len(members), self.lease
+        ):
+            return False
+        renewal = asyncio.create_task(self._renew(run_id))
+        try:
+            await self._run(run_id, members, dates)
+        finally:
+            renewal.cancel()
+        return True
+
+    async def _renew(self, run_id: str):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            await asyncio.to_thread(self.store.renew, run_id, self.lease)
+
+    async def _run(self, run_id: str, members: list, dates: list):
+        gh_client = GitHubClient(
+            token=os.getenv("GITHUB_TOKEN"), store=self.activity_store, limiter=self.limiter, index=self.index
+        )
+        limit = asyncio.Semaphore(self.concurrency)
+        errors = {}
+        completed = 0
+
+        async def warm_member(member: RosterMember):
+            nonlocal completed
+            # Spread the roster over the jitter window instead of starting everyone together
+            await asyncio.sleep(random.uniform(0, self.jitter))
+            async with limit:
+                try:
+                    with span("prewarm.member", days=len(dates)):
+                        await self._warm(gh_client, member, dates)
+                except Exception as e:
+                    errors[member.jira_email] = str(e)
+                completed += 1
+                await asyncio.to_thread(self.store.update, run_id, "running", completed, errors)
+
+        await asyncio.gather(*(warm_member(member) for member in members))
+        await asyncio.to_thread(self.store.update, run_id, "completed", completed, errors)
+
+    async def _warm(self, gh_client: GitHubClient, member: RosterMember, dates: list):
+        # One Jira search covers the range; each of its days is what the summary endpoint reads for that date
+        async with self.jira_limit:
+            jira_by_date = await self.jira_client.get_developer_activity_range(member.jira_email, dates[-1], dates[0])
+        async with self.github_limit:
+            github_by_date = await gh_client.get_activity_range(member.github_username, dates[-1], dates[0])
+        # A source that is not set up has no data; any other error fails the member
+        if jira_by_date.get("unconfigured"):
+            jira_by_date = {}
+        if github_by_date.get("unconfigured"):
+            github_by_date = {}
+        for activity in (jira_by_date, github_by_date):
+            if "error" in activity:
+                raise RuntimeError(activity["error"])
+
+        for date in dates:
+            async with self.llm_limit:
+                await summarize_activity(jira_by_date.get(date, {}), member.llm_provider)
+
+        days = timesheet_days(dates, jira_by_date, github_by_date)
+        async with self.llm_limit:
+            await generate_timesheet_entries(days, timesheet_config(member), member.llm_provider)
+
+def _parse_times(value: str) -> list:
+    # "05:00,13:30" -> [(5, 0), (13, 30)]
+    times = []
+    for part in value.split(","):
+        if part.strip():
+            hour, minute = part.strip().split(":")
+            times.append((int(hour), int(minute)))
+    return sorted(times)
+
+def _next_run(now: datetime, times: list) -> datetime:
+    for day in range(2):
+        for hour, minute in times:
+            run_at = (now + timedelta(days=day)).replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if run_at > now:
+                return run_at
+
+store = PrewarmStore()
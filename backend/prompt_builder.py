@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+# Rough characters-per-token ratio used when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger("autum")
+
+_encodings = {}
+
+async def load_encoding(timeout: float, model: Optional[str] = None) -> bool:
+    """
+    Loads the tiktoken encoding in a background thread, waiting at most
+    `timeout` seconds. tiktoken downloads encodings missing from its cache
+    (TIKTOKEN_CACHE_DIR) with no timeout; until the load finishes, token
+    counts are estimated. Returns whether the encoding is ready.
+    """
+    if tiktoken is None:
+        return False
+    loop = asyncio.get_running_loop()
+    loaded = asyncio.Event()
+
+    def load():
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            _encodings[model or ""] = encoding
+        except Exception as e:
+            logger.warning("tiktoken encoding unavailable, estimating token counts: %s", e)
+        try:
+            loop.call_soon_threadsafe(loaded.set)
+        except RuntimeError:
+            pass # The loop has already shut down
+
+    # A daemon thread, so a download that never returns cannot hold up shutdown
+    threading.Thread(target=load, name="tiktoken-load", daemon=True).start()
+    try:
+        await asyncio.wait_for(loaded.wait(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning("tiktoken encoding not loaded after %ss, estimating token counts meanwhile", timeout)
+    return (model or "") in _encodings
+
+def _encoding(model: Optional[str]):
+    # Only what load_encoding() has loaded; loading here could block the event loop on a download
+    if tiktoken is None:
+        return None
+    return _encodings.get(model or "", _encodings.get(""))
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        limit = max_tokens * CHARS_PER_TOKEN
+        return text if len(text) <= limit else text[:limit - 1] + "…"
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens - 1]) + "…"
+
+def pack(lines: list, budget: int, model: Optional[str] = None):
+    """
+    Packs (priority, section, text) lines into a token budget. Lines are taken
+    in priority order (lower first, then their original order) while they fit;
+    a line that does not fit is truncated if at least a few tokens remain.
+    Returns (section -> kept lines in their original order, tokens used).
+    """
+    order = sorted(range(len(lines)), key=lambda i: lines[i][0])
+    kept = {}
+    used = 0
+    for i in order:
+        _, _, text = lines[i]
+        tokens = count_tokens(text, model)
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining < 16:
+                continue
+            text = truncate_to_tokens(text, remaining, model)
+            tokens = count_tokens(text, model)
+        kept[i] = text
+        used += tokens
+
+    sections = {}
+    for i, (_, section, _) in enumerate(lines):
+        if i in kept:
+            sections.setdefault(section, []).append(kept[i])
+    return sections, used
+
+_MERGE_COMMIT = re.compile(r"^merge (branch|pull request|remote-tracking branch)\b", re.IGNORECASE)
+_NOISE = re.compile(r"[^a-z0-9 ]+")
+
+def _normalize_message(message: str) -> str:
+    # Lowercase, drop punctuation and filler words like "again"/"more"
+    words = _NOISE.sub(" ", message.lower()).split()
+    return " ".join(word for word in words if word not in ("again", "more", "another", "some", "minor"))
+
+def dedupe_commits(github_data: list) -> list:
+    """
+    Drops merge commits and collapses runs of near-identical commit messages
+    (e.g. repeated "fix typo") into the first one, annotated with a count.
+    Non-commit events pass through unchanged.
+    """
+    result = []
+    counts = {}
+    seen = {}
+    for item in github_data:
+        if item.get("type") != "Commit":
+            result.append(item)
+            continue
+        summary = item.get("summary") or ""
+        if _MERGE_COMMIT.match(summary):
+            continue
+        key = (item.get("repo"), _normalize_message(summary))
+        if key in seen:
+            counts[seen[key]] += 1
+            continue
+        seen[key] = len(result)
+        counts[len(result)] = 1
+        result.append(item)
+
+    return [
+        {**item, "summary": f"{item['summary']} (x{counts[i]})"} if counts.get(i, 1) > 1 else item
+        for i, item in enumerate(result)
+    ]
+
+def token_budget(kind: str) -> int:
+    defaults = {"summary": "3000", "remark": "800"}
+    return int(os.getenv(f"PROMPT_TOKEN_BUDGET_{kind.upper()}", defaults[kind]))
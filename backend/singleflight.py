@@ -0,0 +1,47 @@
+import asyncio
+import os
+from tracing import COALESCED_CALLS
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    later callers with the same key await its result (or exception) instead
+    of starting their own. Nothing is kept once the call finishes, so this
+    only merges bursts; caching is left to LLMCache and ActivityStore.
+
+    The call runs as its own task and is only cancelled once every caller
+    waiting on it has gone, so one client disconnecting does not fail the
+    others. Results are shared between callers and must not be mutated.
+    Coalescing is per process; each server worker has its own flights.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.enabled = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+        # key -> [task, number of callers waiting on it]
+        self._flights = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        if not self.enabled:
+            return await fn(*args, **kwargs)
+
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            flight = self._flights[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(key, flight))
+            COALESCED_CALLS.inc(group=self.name, role="leader")
+        else:
+            COALESCED_CALLS.inc(group=self.name, role="shared")
+
+        flight[1] += 1
+        try:
+            return await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+            if flight[1] == 0 and not flight[0].done():
+                # Nobody is left to use the result
+                flight[0].cancel()
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
@@ -0,0 +1,14 @@
+import os
+import sqlite3
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite connection that threads of this process share and that
+    several server worker processes can use on the same file at once: WAL lets
+    readers run alongside a writer, and the busy timeout waits out another
+    process's write lock instead of failing.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=float(os.getenv("SQLITE_BUSY_TIMEOUT", "5")))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are imported flat, as the app does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
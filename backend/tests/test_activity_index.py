@@ -0,0 +1,194 @@
+"""
+The activity index must serve a day exactly as a client backfill would build
+it. Each test replays the same activity twice: as upstream API responses
+through a MockTransport, and as the webhook deliveries Jira and GitHub send
+for it, then compares the two days.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from activity_index import ActivityIndex
+from github_client import GitHubClient
+from jira_client import JiraClient
+
+EMAIL = "dev@example.com"
+USERNAME = "dev"
+REPO = "acme/app"
+
+@pytest.fixture
+def index(tmp_path):
+    index = ActivityIndex(path=str(tmp_path / "activity_index.db"))
+    index.enabled = True
+    return index
+
+def today() -> str:
+    # GitHub dates events in UTC, and so do the webhooks without a timestamp
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+def _sorted_items(items: list) -> list:
+    # Within events and within commits, order follows the feed or delivery order
+    return sorted(items, key=lambda item: (item["type"], str(item["key"]), item.get("action") or ""))
+
+def _sorted_issues(day: dict) -> dict:
+    return {**day, "issues": sorted(day["issues"], key=lambda issue: issue["key"])}
+
+def github_transport(date: str) -> httpx.MockTransport:
+    events = [
+        {"type": "PushEvent", "created_at": f"{date}T10:00:00Z", "repo": {"name": REPO}, "payload": {"size": 2}},
+        {"type": "CreateEvent", "created_at": f"{date}T09:00:00Z", "repo": {"name": REPO},
+         "payload": {"ref": "feature/login", "ref_type": "branch"}},
+        {"type": "PullRequestEvent", "created_at": f"{date}T11:00:00Z", "repo": {"name": REPO},
+         "payload": {"action": "opened", "pull_request": {
+             "title": "Add login", "html_url": f"https://github.com/{REPO}/pull/7"}}},
+        {"type": "PullRequestEvent", "created_at": f"{date}T11:05:00Z", "repo": {"name": REPO},
+         "payload": {"action": "labeled", "pull_request": {
+             "title": "Add login", "html_url": f"https://github.com/{REPO}/pull/7"}}},
+    ]
+    commits = [
+        {"sha": sha, "commit": {"message": message, "author": {"date": f"{date}T08:00:00Z"},
+                                "committer": {"date": f"{date}T08:00:00Z"}}}
+        for sha, message in (("a" * 40, "Add login form\n\nWith validation"), ("b" * 40, "Fix typo"))
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == f"/users/{USERNAME}/events":
+            return httpx.Response(200, json=events if request.url.params.get("page") == "1" else [])
+        if request.url.path == f"/repos/{REPO}/commits":
+            return httpx.Response(200, json=commits)
+        return httpx.Response(404, json={"message": "Not Found"})
+
+    return httpx.MockTransport(handler)
+
+def github_deliveries(date: str) -> list:
+    repository = {"full_name": REPO, "default_branch": "main"}
+    sender = {"login": USERNAME}
+    return [
+        ("create", {"ref": "feature/login", "ref_type": "branch", "repository": repository, "sender": sender}),
+        ("push", {
+            "ref": "refs/heads/main", "repository": repository, "sender": sender,
+            "pusher": {"name": USERNAME, "email": EMAIL},
+            "commits": [
+                {"id": sha, "message": message, "timestamp": f"{date}T08:00:00+00:00",
+                 "author": {"name": "Dev", "email": EMAIL, "username": USERNAME}}
+                for sha, message in (("a" * 40, "Add login form\n\nWith validation"), ("b" * 40, "Fix typo"))
+            ]
+        }),
+        # Pushes to other branches are not what the backfill reads
+        ("push", {
+            "ref": "refs/heads/feature/login", "repository": repository, "sender": sender,
+            "pusher": {"name": USERNAME, "email": EMAIL},
+            "commits": [{"id": "c" * 40, "message": "WIP", "timestamp": f"{date}T08:30:00+00:00",
+                         "author": {"name": "Dev", "email": EMAIL, "username": USERNAME}}]
+        }),
+        ("pull_request", {"action": "opened", "repository": repository, "sender": sender, "pull_request": {
+            "title": "Add login", "html_url": f"https://github.com/{REPO}/pull/7", "updated_at": f"{date}T11:00:00Z"}}),
+        ("pull_request", {"action": "labeled", "repository": repository, "sender": sender, "pull_request": {
+            "title": "Add login", "html_url": f"https://github.com/{REPO}/pull/7", "updated_at": f"{date}T11:05:00Z"}}),
+    ]
+
+def test_github_day_from_webhooks_matches_backfill(index):
+    date = today()
+    client = GitHubClient(token="test", transport=github_transport(date))
+    backfill = asyncio.run(client.get_activity_range(USERNAME, date, date))
+
+    index.reconcile_github(USERNAME, {date: []}, fetched_at=time.time() - 1)
+    for event, payload in github_deliveries(date):
+        index.ingest_github(event, payload)
+    indexed = index.github_days(USERNAME, [date])
+
+    assert {item["type"] for item in backfill[date]} == {"CreateEvent", "PullRequestEvent", "Commit"}
+    assert _sorted_items(indexed[date]) == _sorted_items(backfill[date])
+
+def test_github_backfill_is_kept_when_webhooks_repeat_it(index):
+    date = today()
+    client = GitHubClient(token="test", transport=github_transport(date))
+    backfill = asyncio.run(client.get_activity_range(USERNAME, date, date))
+
+    index.reconcile_github(USERNAME, backfill, fetched_at=time.time() - 1)
+    for event, payload in github_deliveries(date):
+        index.ingest_github(event, payload)
+
+    assert _sorted_items(index.github_days(USERNAME, [date])[date]) == _sorted_items(backfill[date])
+
+DATE = "2026-03-02"
+
+def _user(email: str, account_id: str) -> dict:
+    return {"accountId": account_id, "emailAddress": email, "displayName": email.split("@")[0]}
+
+def _adf(text: str) -> dict:
+    return {"type": "doc", "version": 1,
+            "content": [{"type": "paragraph", "content": [{"type": "text", "text": text}]}]}
+
+# (worklog id, issue id, author email, started, seconds, comment)
+WORKLOGS = [
+    ("101", "10001", EMAIL, f"{DATE}T09:00:00.000+0000", 3600, "Login form"),
+    ("102", "10001", EMAIL, f"{DATE}T14:00:00.000+0000", 1800, None),
+    ("103", "10001", "other@example.com", f"{DATE}T10:00:00.000+0000", 7200, "Not ours"),
+    ("104", "10002", EMAIL, f"{DATE}T16:00:00.000+0000", 900, "Review"),
+    ("105", "10002", EMAIL, "2026-03-01T16:00:00.000+0000", 900, "Another day"),
+]
+ISSUES = {"10001": ("APP-1", "Login page", "In Progress"), "10002": ("APP-2", "Code review", "Done")}
+
+def jira_transport() -> httpx.MockTransport:
+    issues = [
+        {"id": issue_id, "key": key, "fields": {
+            "summary": summary, "status": {"name": status},
+            "worklog": {"startAt": 0, "maxResults": 20, "total": len(worklogs), "worklogs": worklogs}
+        }}
+        for issue_id, (key, summary, status) in ISSUES.items()
+        for worklogs in [[
+            {"id": worklog_id, "issueId": issue_id, "author": _user(email, email), "started": started,
+             "timeSpentSeconds": seconds, **({"comment": _adf(comment)} if comment else {})}
+            for worklog_id, worklog_issue, email, started, seconds, comment in WORKLOGS
+            if worklog_issue == issue_id
+        ]]
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/rest/api/3/search/jql":
+            return httpx.Response(200, json={"issues": issues, "isLast": True})
+        return httpx.Response(404, json={"errorMessages": ["Not Found"]})
+
+    return httpx.MockTransport(handler)
+
+def jira_deliveries() -> list:
+    deliveries = [
+        {"webhookEvent": "jira:issue_created", "issue": {"id": issue_id, "key": key, "fields": {
+            "summary": summary, "status": {"name": status}}}}
+        for issue_id, (key, summary, status) in ISSUES.items()
+    ]
+    # Worklog webhooks carry the comment as plain text
+    deliveries += [
+        {"webhookEvent": "worklog_created", "worklog": {
+            "id": worklog_id, "issueId": issue_id, "author": _user(email, email), "started": started,
+            "timeSpentSeconds": seconds, **({"comment": comment} if comment else {})}}
+        for worklog_id, issue_id, email, started, seconds, comment in WORKLOGS
+    ]
+    return deliveries
+
+def test_jira_day_from_webhooks_matches_backfill(index):
+    client = JiraClient(jira_url="https://jira.example.com", transport=jira_transport())
+    backfill = asyncio.run(client.get_developer_activity_range(EMAIL, DATE, DATE))
+    asyncio.run(client.aclose())
+
+    index.reconcile_jira(EMAIL, DATE, DATE, [], fetched_at=time.time() - 1)
+    for payload in jira_deliveries():
+        assert "unknown_issue" not in index.ingest_jira(payload)
+    indexed = index.jira_days(EMAIL, [DATE])
+
+    assert backfill[DATE]["total_time_seconds"] == 3600 + 1800 + 900
+    assert _sorted_issues(indexed[DATE]) == _sorted_issues(backfill[DATE])
+
+def test_jira_deleted_worklog_leaves_the_day(index):
+    index.reconcile_jira(EMAIL, DATE, DATE, [], fetched_at=time.time() - 1)
+    for payload in jira_deliveries():
+        index.ingest_jira(payload)
+    index.ingest_jira({"webhookEvent": "worklog_deleted", "worklog": {"id": "104", "issueId": "10002"}})
+
+    day = index.jira_days(EMAIL, [DATE])[DATE]
+    assert [issue["key"] for issue in day["issues"]] == ["APP-1"]
+    assert day["total_time_seconds"] == 3600 + 1800
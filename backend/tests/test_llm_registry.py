@@ -0,0 +1,101 @@
+"""
+Routing must only count a provider's own failures against its circuit
+breaker: a call that is cancelled, closed early or loses a hedge race frees
+its slot without being recorded either way. The LLM clients are replaced by
+fakes, so no provider is called.
+"""
+import asyncio
+import time
+
+import pytest
+
+from llm_registry import LLMRegistry
+
+class FakeLLM:
+    """
+    Answers after `delay` seconds; streams `chunks` chunks.
+    """
+    def __init__(self, delay: float = 0.0, chunks: int = 3):
+        self.delay = delay
+        self.chunks = chunks
+        self.cancelled = False
+
+    async def ainvoke(self, messages):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "answer"
+
+    async def astream(self, messages):
+        for i in range(self.chunks):
+            await asyncio.sleep(self.delay)
+            yield f"chunk {i}"
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = LLMRegistry()
+    registry.provider_order = ["openai", "grok"]
+    llms = {"openai": FakeLLM(), "grok": FakeLLM()}
+    monkeypatch.setattr(registry, "get_llm", lambda provider, model=None, temperature=0.7: llms[provider])
+    registry.llms = llms
+    return registry
+
+def half_open(registry: LLMRegistry, provider: str):
+    breaker = registry.breaker(provider)
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+    assert breaker.state == "half_open"
+    return breaker
+
+def test_stream_closed_mid_way_frees_half_open_trial(registry):
+    breaker = half_open(registry, "openai")
+
+    async def read_one():
+        stream = registry.astream("openai", [])
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+    asyncio.run(read_one())
+
+    assert not breaker.trial_running
+    assert breaker.state == "half_open"
+    assert registry.stats()["openai"]["calls"] == 0
+    # The next call is let through as the trial
+    assert breaker.allow()
+
+def test_hedge_loser_is_cancelled_without_counting_as_failure(registry):
+    registry.hedge = True
+    registry.hedge_delay = 0.01
+    registry.llms["openai"].delay = 1.0
+
+    result = asyncio.run(registry.ainvoke("openai", []))
+
+    assert result == "answer"
+    assert registry.llms["openai"].cancelled
+    stats = registry.stats()
+    assert stats["openai"]["calls"] == 0
+    assert stats["openai"]["errors"] == 0
+    assert stats["grok"]["calls"] == 1
+    assert registry.breaker("openai").consecutive_failures == 0
+    assert registry.breaker("openai").state == "closed"
+
+def test_cancelled_half_open_trial_frees_the_slot(registry):
+    breaker = half_open(registry, "openai")
+    registry.llms["openai"].delay = 10.0
+
+    async def cancel_mid_call():
+        task = asyncio.create_task(registry.ainvoke("openai", []))
+        await asyncio.sleep(0.01)
+        assert breaker.trial_running
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_mid_call())
+
+    assert not breaker.trial_running
+    assert breaker.state == "half_open"
+    assert registry.stats()["openai"]["errors"] == 0
+    assert breaker.allow()
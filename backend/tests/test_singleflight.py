@@ -0,0 +1,60 @@
+"""
+A coalesced call belongs to every caller waiting on it: the one that started
+it may go away without failing the others, and the call is only cancelled
+once nobody is waiting any more.
+"""
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+@pytest.fixture
+def flight():
+    flight = SingleFlight("test")
+    flight.enabled = True
+    return flight
+
+def test_leader_disconnecting_does_not_cancel_shared_flight(flight):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "data"
+
+    async def run():
+        leader = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "data"
+    assert len(calls) == 1
+
+def test_flight_is_cancelled_once_every_caller_is_gone(flight):
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        callers = [asyncio.create_task(flight.do("key", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        # Let the flight's own task see its cancellation
+        await asyncio.sleep(0)
+        return flight._flights
+
+    assert asyncio.run(run()) == {}
+    assert cancelled == [1]
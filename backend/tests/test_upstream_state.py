@@ -0,0 +1,52 @@
+"""
+The limiter keeps RATE_LIMIT_RESERVE calls of an upstream's reported quota
+back: once the quota falls to the reserve, calls wait for the window to
+reset instead of spending it.
+"""
+import asyncio
+import time
+
+import pytest
+
+from upstream_state import RateLimitExceeded, UpstreamLimiter
+
+KEY = "github:test"
+
+@pytest.fixture
+def limiter(tmp_path):
+    limiter = UpstreamLimiter(path=str(tmp_path / "upstream_state.db"))
+    limiter.reserve = 5
+    return limiter
+
+def report(limiter: UpstreamLimiter, remaining: int, reset_in: float, quota: int = 5000):
+    limiter.observe(KEY, {
+        "X-RateLimit-Limit": str(quota),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(time.time() + reset_in)
+    })
+
+def test_take_waits_until_reset_once_remaining_reaches_reserve(limiter):
+    report(limiter, remaining=5, reset_in=30)
+
+    wait = limiter._take(KEY, rate=10, burst=20)
+
+    assert 29 < wait <= 30
+
+def test_take_spends_quota_above_reserve(limiter):
+    report(limiter, remaining=6, reset_in=30, quota=6)
+
+    assert limiter._take(KEY, rate=10, burst=20) == 0
+    # That call took the quota down to the reserve
+    assert limiter._take(KEY, rate=10, burst=20) > 29
+
+def test_take_ignores_reserve_after_the_window_resets(limiter):
+    report(limiter, remaining=0, reset_in=-1)
+
+    assert limiter._take(KEY, rate=10, burst=20) == 0
+
+def test_acquire_fails_fast_when_reset_is_beyond_max_wait(limiter):
+    limiter.max_wait = 10
+    report(limiter, remaining=5, reset_in=30)
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.acquire(KEY, rate=10, burst=20))
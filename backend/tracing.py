@@ -0,0 +1,472 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from sqlite_store import connect
+from typing import Optional
+
+logger = logging.getLogger("autum.trace")
+
+# Latency buckets in seconds, from a cached lookup to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values: dict, other: dict):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def expose(self, values: dict) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+class Gauge:
+    """
+    Across workers a gauge reports the most recently set value, or with
+    aggregate="sum" the total over the workers that are still running.
+    """
+    def __init__(self, name: str, help: str, labels: tuple, aggregate: str = "latest"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.aggregate = aggregate
+        # label values -> [value, when it was set]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = [value, time.time()]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    def merge(self, values: dict, other: dict):
+        for key, (value, set_at) in other.items():
+            current = values.get(key)
+            if current is None:
+                values[key] = [value, set_at]
+            elif self.aggregate == "sum":
+                current[0] += value
+            elif set_at > current[1]:
+                values[key] = [value, set_at]
+
+    def expose(self, values: dict) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, (value, _) in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [bucket counts..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {key: list(series) for key, series in self._values.items()}
+
+    def merge(self, values: dict, other: dict):
+        for key, series in other.items():
+            current = values.get(key)
+            if current is None:
+                values[key] = list(series)
+            else:
+                values[key] = [a + b for a, b in zip(current, series)]
+
+    def expose(self, values: dict) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(values.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (repr(bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + ('+Inf',))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+STAGE_SECONDS = Histogram(
+    "autum_stage_duration_seconds", "Time spent per pipeline stage.", ("stage", "outcome")
+)
+LLM_SECONDS = Histogram(
+    "autum_llm_request_duration_seconds", "LLM call latency per provider.", ("provider", "outcome")
+)
+LLM_PROMPT_TOKENS = Counter(
+    "autum_llm_prompt_tokens_total", "Prompt tokens sent per provider.", ("provider",)
+)
+LLM_ROUTING = Counter(
+    "autum_llm_routing_total", "LLM failovers, hedged requests and circuit-open skips per provider.",
+    ("provider", "event")
+)
+UPSTREAM_RESPONSES = Counter(
+    "autum_upstream_responses_total", "Upstream HTTP responses by status code.", ("upstream", "status")
+)
+QUOTA_REMAINING = Gauge(
+    "autum_upstream_quota_remaining", "Last reported remaining upstream quota per credential.", ("key",)
+)
+QUOTA_RESET = Gauge(
+    "autum_upstream_quota_reset_timestamp", "When the upstream quota window resets (epoch seconds).", ("key",)
+)
+THROTTLE_SECONDS = Counter(
+    "autum_upstream_throttle_seconds_total", "Time calls spent queued by the upstream rate limiter.", ("key",)
+)
+CACHE_LOOKUPS = Counter(
+    "autum_cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result")
+)
+COALESCED_CALLS = Counter(
+    "autum_singleflight_calls_total",
+    "Calls per coalescing group: leaders start the work, shared calls join one in flight.", ("group", "role")
+)
+COALESCE_RATIO = Gauge(
+    "autum_singleflight_dedup_ratio", "Share of calls served by joining an identical call in flight.", ("group",)
+)
+CIRCUITS_OPEN = Gauge(
+    "autum_llm_circuits_open", "Workers whose circuit breaker for the provider is open or half-open.",
+    ("provider",), aggregate="sum"
+)
+HTTP_SECONDS = Histogram(
+    "autum_http_request_duration_seconds", "API request latency, including streamed bodies.",
+    ("method", "path", "status")
+)
+
+METRICS = [
+    STAGE_SECONDS, LLM_SECONDS, LLM_PROMPT_TOKENS, LLM_ROUTING, UPSTREAM_RESPONSES,
+    QUOTA_REMAINING, QUOTA_RESET, THROTTLE_SECONDS, CACHE_LOOKUPS, COALESCED_CALLS, COALESCE_RATIO,
+    CIRCUITS_OPEN, HTTP_SECONDS
+]
+
+# Called before every snapshot, to set gauges that are read from live state
+_collectors = []
+
+def add_collector(collect):
+    _collectors.append(collect)
+
+def snapshot() -> dict:
+    """
+    Returns this process's metrics as metric name -> label values -> value.
+    """
+    for collect in _collectors:
+        collect()
+    return {metric.name: metric.snapshot() for metric in METRICS}
+
+class SharedMetrics:
+    """
+    Keeps a snapshot of every server worker's metrics in SQLite, so /metrics
+    reports the whole server whichever worker answers the scrape. Workers
+    publish every METRICS_PUBLISH_INTERVAL seconds and on each scrape. Once a
+    worker has not published for METRICS_STALE_AFTER seconds its counters and
+    histograms are folded into a "retired" row, so totals never go backwards
+    when gunicorn recycles workers, and its gauges are dropped.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("METRICS_STATE_PATH", "metrics.db")
+        self.enabled = os.getenv("METRICS_SHARED", "true").lower() == "true"
+        self.stale_after = float(os.getenv("METRICS_STALE_AFTER", "300"))
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._worker = None
+
+    def _db(self):
+        if self._pid != os.getpid():
+            # A forked worker publishes under its own name and connection
+            self._pid = os.getpid()
+            self._worker = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+            self._conn = connect(self.path)
+            self._conn.isolation_level = None
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "worker TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def publish(self, current: dict) -> list:
+        """
+        Stores this worker's snapshot, retires stale workers and returns the
+        snapshots of every worker, this one included.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute("SELECT worker, snapshot, updated_at FROM snapshots").fetchall()
+                snapshots = {worker: _decode(data) for worker, data, _ in rows}
+                stale = [
+                    worker for worker, _, updated_at in rows
+                    if worker not in ("retired", self._worker) and updated_at < now - self.stale_after
+                ]
+                if stale:
+                    retired = snapshots.pop("retired", {})
+                    for worker in stale:
+                        retired = _merge([retired, snapshots.pop(worker)], gauges=False)
+                        db.execute("DELETE FROM snapshots WHERE worker = ?", (worker,))
+                    db.execute(
+                        "INSERT OR REPLACE INTO snapshots (worker, snapshot, updated_at) VALUES ('retired', ?, ?)",
+                        (_encode(retired), now)
+                    )
+                    snapshots["retired"] = retired
+                db.execute(
+                    "INSERT OR REPLACE INTO snapshots (worker, snapshot, updated_at) VALUES (?, ?, ?)",
+                    (self._worker, _encode(current), now)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        snapshots[self._worker] = current
+        return list(snapshots.values())
+
+def _encode(snapshot: dict) -> str:
+    return json.dumps({
+        name: [[list(key), value] for key, value in values.items()] for name, values in snapshot.items()
+    })
+
+def _decode(data: str) -> dict:
+    return {name: {tuple(key): value for key, value in values} for name, values in json.loads(data).items()}
+
+def _merge(snapshots: list, gauges: bool = True) -> dict:
+    merged = {}
+    for metric in METRICS:
+        if not gauges and isinstance(metric, Gauge):
+            continue
+        values = merged[metric.name] = {}
+        for snapshot in snapshots:
+            metric.merge(values, snapshot.get(metric.name, {}))
+    return merged
+
+shared_metrics = SharedMetrics()
+
+def render_metrics() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format, summed
+    over all server workers when SharedMetrics is enabled.
+    """
+    current = snapshot()
+    snapshots = [current]
+    if shared_metrics.enabled:
+        try:
+            snapshots = shared_metrics.publish(current)
+        except sqlite3.Error as e:
+            logger.warning("Serving this worker's metrics only: %s", e)
+    merged = _merge(snapshots)
+    # A ratio does not add up across workers; derive it from the summed calls
+    ratios = merged[COALESCE_RATIO.name] = {}
+    calls = merged[COALESCED_CALLS.name]
+    for group in {group for group, _ in calls}:
+        total = sum(value for (name, _), value in calls.items() if name == group)
+        ratios[(group,)] = [round(calls.get((group, "shared"), 0) / total, 4) if total else 0, 0]
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.expose(merged[metric.name]))
+    return "\n".join(lines) + "\n"
+
+async def publish_metrics(interval: float):
+    """
+    Publishes this worker's metrics to SharedMetrics every `interval` seconds
+    until cancelled, and once more on the way out.
+    """
+    if not shared_metrics.enabled:
+        return
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await _publish()
+    finally:
+        await _publish()
+
+async def _publish():
+    try:
+        await asyncio.to_thread(shared_metrics.publish, snapshot())
+    except sqlite3.Error as e:
+        logger.warning("Could not publish metrics: %s", e)
+
+# The trace of the API request being served; asyncio tasks copy the context,
+# so spans recorded there land in the same list
+_trace = contextvars.ContextVar("autum_trace", default=None)
+
+class Trace:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.start = time.perf_counter()
+        self.spans = []
+        self.cache = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self.spans.append(record)
+
+    def count_cache(self, cache: str, hits: int, misses: int):
+        with self._lock:
+            counts = self.cache.setdefault(cache, {"hits": 0, "misses": 0})
+            counts["hits"] += hits
+            counts["misses"] += misses
+
+def current_request_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.request_id if trace else None
+
+def record_span(name: str, duration: float, error: Optional[Exception] = None, **attrs):
+    """
+    Records a finished stage: observes its latency and, inside a request,
+    appends it to the request's trace.
+    """
+    outcome = "error" if error is not None else "ok"
+    STAGE_SECONDS.observe(duration, stage=name, outcome=outcome)
+    trace = _trace.get()
+    if trace is not None:
+        record = {
+            "name": name,
+            "offset_ms": round((time.perf_counter() - duration - trace.start) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+            "outcome": outcome,
+            **attrs
+        }
+        if error is not None:
+            record["error"] = str(error)[:200]
+        trace.add(record)
+
+def count_cache(cache: str, hits: int = 0, misses: int = 0):
+    """
+    Counts cache hits and misses, globally and on the current request's trace.
+    """
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+    trace = _trace.get()
+    if trace is not None:
+        trace.count_cache(cache, hits, misses)
+
+def observe_upstream(upstream: str, status):
+    UPSTREAM_RESPONSES.inc(upstream=upstream, status=status)
+
+class Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, key: str, value):
+        self.attrs[key] = value
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times the enclosed block as a pipeline stage. Attributes (status codes,
+    token counts, cache hits) can be added with .set() on the yielded span.
+    """
+    current = Span(name, attrs)
+    start = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        record_span(name, time.perf_counter() - start, e, **current.attrs)
+        raise
+    record_span(name, time.perf_counter() - start, **current.attrs)
+
+class TracingMiddleware:
+    """
+    ASGI middleware that opens a trace per request, tags the response with
+    X-Request-ID and, once the last body chunk is sent (so streamed responses
+    are timed to the end), logs the trace as one JSON line.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode() or uuid.uuid4().hex
+        trace = Trace(request_id)
+        token = _trace.set(trace)
+        status = {"code": 500}
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            duration = time.perf_counter() - trace.start
+            # Route templates keep the label set small; unmatched paths share one label
+            path = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(duration, method=scope["method"], path=path, status=status["code"])
+            if path != "/metrics" and logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": path,
+                    "status": status["code"],
+                    "duration_ms": round(duration * 1000, 1),
+                    "cache": trace.cache,
+                    "spans": trace.spans
+                }))
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode())]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            finish()
+            _trace.reset(token)
@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from sqlite_store import connect
+from tracing import QUOTA_REMAINING, QUOTA_RESET, THROTTLE_SECONDS
+from typing import Optional
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when an upstream's quota would not free up within the maximum
+    queueing time, instead of letting the call fail or come back empty.
+    """
+
+class UpstreamLimiter:
+    """
+    Token bucket per upstream credential, kept in SQLite so every server
+    worker process draws from the same bucket. Calls are also held back while
+    a Retry-After is in force and, once the reported quota (X-RateLimit-*)
+    runs low, paced to spread what is left over the rest of the window.
+    acquire() waits for a slot rather than failing; it only raises
+    RateLimitExceeded if the wait would exceed RATE_LIMIT_MAX_WAIT.
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("UPSTREAM_STATE_PATH", "upstream_state.db")
+        self.max_wait = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))
+        # Below this fraction of the quota, calls are spread over the rest of the window
+        self.pace_below = float(os.getenv("RATE_LIMIT_PACE_BELOW", "0.2"))
+        self.reserve = int(os.getenv("RATE_LIMIT_RESERVE", "0"))
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            # Autocommit, so the explicit BEGIN IMMEDIATE below owns the transaction
+            self._conn.isolation_level = None
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS limits ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, refilled_at REAL NOT NULL, "
+                "blocked_until REAL NOT NULL DEFAULT 0, quota_limit INTEGER, "
+                "quota_remaining INTEGER, quota_reset REAL)"
+            )
+        return self._conn
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        """
+        Waits until a call to the upstream may be made and takes the slot.
+        Returns the time spent waiting.
+        """
+        waited = 0.0
+        while True:
+            # Off the event loop: the transaction may wait on another worker's write lock
+            wait = await asyncio.to_thread(self._take, key, rate, burst)
+            if wait <= 0:
+                if waited:
+                    THROTTLE_SECONDS.inc(waited, key=key)
+                return waited
+            if waited + wait > self.max_wait:
+                raise RateLimitExceeded(f"Rate limit for {key}: next call allowed in {wait:.0f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _take(self, key: str, rate: float, burst: float) -> float:
+        """
+        Takes a slot and returns 0, or returns how long to wait for one.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT tokens, refilled_at, blocked_until, quota_limit, quota_remaining, quota_reset "
+                    "FROM limits WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, refilled_at, blocked_until, quota_limit, remaining, reset = row or (
+                    burst, now, 0.0, None, None, None
+                )
+                if reset is None or now >= reset:
+                    # No window, or it has rolled over; the next response reports the new one
+                    remaining = reset = None
+                if remaining is not None and quota_limit and remaining < quota_limit * self.pace_below:
+                    rate = min(rate, max(remaining - self.reserve, 0) / max(reset - now, 1.0))
+                tokens = min(burst, tokens + (now - refilled_at) * rate)
+
+                if blocked_until > now:
+                    wait = blocked_until - now
+                elif remaining is not None and remaining <= self.reserve:
+                    wait = reset - now
+                elif tokens < 1:
+                    wait = (1 - tokens) / rate if rate > 0 else reset - now
+                else:
+                    wait = 0.0
+                    tokens -= 1
+                    if remaining is not None:
+                        remaining -= 1
+
+                db.execute(
+                    "INSERT OR REPLACE INTO limits "
+                    "(key, tokens, refilled_at, blocked_until, quota_limit, quota_remaining, quota_reset) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, tokens, now, blocked_until, quota_limit, remaining, reset)
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return wait
+
+    def observe(self, key: str, headers) -> Optional[float]:
+        """
+        Records the quota an upstream response reports (X-RateLimit-Limit,
+        -Remaining and -Reset). Returns the seconds until the quota resets if
+        it is used up, so the caller can tell a quota 403 from a permission one.
+        """
+        remaining = _int_header(headers, "X-RateLimit-Remaining")
+        if remaining is None:
+            return None
+        quota_limit = _int_header(headers, "X-RateLimit-Limit")
+        reset = _reset_header(headers.get("X-RateLimit-Reset"))
+
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO limits (key, tokens, refilled_at, quota_limit, quota_remaining, quota_reset) "
+                "VALUES (?, 1, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "quota_limit = excluded.quota_limit, quota_remaining = excluded.quota_remaining, "
+                "quota_reset = excluded.quota_reset",
+                (key, time.time(), quota_limit, remaining, reset)
+            )
+
+        QUOTA_REMAINING.set(remaining, key=key)
+        if reset is not None:
+            QUOTA_RESET.set(reset, key=key)
+        if remaining <= 0 and reset is not None:
+            return max(0.0, reset - time.time())
+        return None
+
+    def block(self, key: str, seconds: float):
+        """
+        Holds back every call for the key for `seconds` (e.g. from Retry-After).
+        Never shortens a block another worker has set.
+        """
+        until = time.time() + seconds
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO limits (key, tokens, refilled_at, blocked_until) VALUES (?, 0, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                (key, time.time(), until)
+            )
+
+def credential_key(upstream: str, *parts) -> str:
+    """
+    Limiter key for an upstream and credential; the credential is hashed so
+    tokens never end up in the database or metrics labels.
+    """
+    digest = hashlib.sha256(":".join(str(part or "") for part in parts).encode()).hexdigest()[:12]
+    return f"{upstream}:{digest}"
+
+def retry_after_seconds(response) -> Optional[float]:
+    """
+    Parses a Retry-After header given either in seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+
+def _int_header(headers, name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+def _reset_header(value: Optional[str]) -> Optional[float]:
+    # GitHub sends epoch seconds, Jira an ISO 8601 timestamp
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+limiter = UpstreamLimiter()
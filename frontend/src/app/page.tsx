@@ -1,7 +1,7 @@
 'use client';
 
 import { useState } from 'react';
-import { fetchActivitySummary } from '@/lib/api';
+import { streamActivitySummary } from '@/lib/api';
 import { ActivitySummary } from '@/lib/types';
 import Link from 'next/link';
 import { ActivityInput } from '../components/ActivityInput';
@@ -29,9 +29,24 @@ export default function Home() {
     }
     setLoading(true);
     setError(null);
+    setSummary(null);
     try {
-      const data = await fetchActivitySummary(email, date, llmProvider);
-      setSummary(data);
+      // Show the Jira details as soon as they arrive, then grow the summary token by token
+      await streamActivitySummary(email, date, llmProvider, (event) => {
+        if (event.event === 'details') {
+          setSummary({
+            total_hours: event.total_hours,
+            issues_worked_on: event.issues_worked_on,
+            details: event.details,
+            summary: '',
+            status: 'Generating...',
+          });
+        } else if (event.event === 'token') {
+          setSummary(prev => prev && { ...prev, summary: prev.summary + event.text });
+        } else if (event.event === 'summary') {
+          setSummary(event.summary);
+        }
+      });
     } catch (err) {
       setError('Failed to fetch data. Please check backend connection and inputs.');
       console.error(err);
@@ -15,11 +15,13 @@ interface TimesheetEntry {
     billable: string;
     role: string;
     site: string;
+    cached?: boolean;
 }
 
 export default function TimesheetPage() {
     const [loading, setLoading] = useState(false);
     const [entries, setEntries] = useState<TimesheetEntry[]>([]);
+    const [progress, setProgress] = useState('');
     const [config, setConfig] = useState({
         jira_email: '',
         jira_project_key: 'PROJ',
@@ -62,24 +64,52 @@ export default function TimesheetPage() {
 
     const generateTimesheet = async () => {
         setLoading(true);
+        setEntries([]);
+        setProgress('Starting...');
         try {
-            const response = await fetch('http://localhost:8000/timesheet/generate', {
+            const response = await fetch('http://localhost:8000/timesheet/generate/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(config),
             });
 
-            if (!response.ok) {
+            if (!response.ok || !response.body) {
                 throw new Error('Failed to generate timesheet');
             }
 
-            const data = await response.json();
-            setEntries(data);
+            // NDJSON: one event per line, rows are rendered as soon as they arrive
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const rows: { index: number; entry: TimesheetEntry }[] = [];
+            let buffer = '';
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const lines = buffer.split('\n');
+                buffer = lines.pop() ?? '';
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const event = JSON.parse(line);
+                    if (event.event === 'entry') {
+                        rows.push({ index: event.index, entry: event.entry });
+                        rows.sort((a, b) => a.index - b.index);
+                        setEntries(rows.map(row => row.entry));
+                    } else if (event.event === 'progress') {
+                        setProgress(event.stage);
+                    } else if (event.event === 'error') {
+                        throw new Error(event.detail);
+                    }
+                }
+            }
         } catch (error) {
             console.error('Error:', error);
             alert('Failed to generate timesheet. See console for details.');
         } finally {
             setLoading(false);
+            setProgress('');
         }
     };
 
@@ -195,7 +225,7 @@ export default function TimesheetPage() {
                                 disabled={loading}
                                 className="w-full flex justify-center py-2 px-4 border border-transparent rounded-md shadow-sm text-sm font-medium text-white bg-blue-600 hover:bg-blue-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-blue-500 disabled:opacity-50"
                             >
-                                {loading ? 'Generating...' : 'Generate Timesheet'}
+                                {loading ? `Generating... ${progress}` : 'Generate Timesheet'}
                             </button>
                         </div>
                     </div>
@@ -212,7 +242,7 @@ export default function TimesheetPage() {
                         </div>
 
                         {entries.length === 0 ? (
-                            <p>Click &quot;Generate Timesheet&quot; to fetch data from Jira and GitHub.</p>
+                            <p>{loading ? `Generating... ${progress}` : 'Click "Generate Timesheet" to fetch data from Jira and GitHub.'}</p>
                         ) : (
                             <div className="overflow-x-auto">
                                 <table className="min-w-full divide-y divide-gray-200 border">
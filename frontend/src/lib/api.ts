@@ -1,4 +1,4 @@
-import { ActivitySummary } from './types';
+import { ActivitySummary, IssueDetail } from './types';
 
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -17,3 +17,50 @@ export async function fetchActivitySummary(email: string, date: string, llmProvi
 
     return response.json();
 }
+
+export type SummaryStreamEvent =
+    | { event: 'details'; total_hours: number; issues_worked_on: string[]; details: IssueDetail[] }
+    | { event: 'token'; text: string }
+    | { event: 'summary'; summary: ActivitySummary }
+    | { event: 'error'; detail: string };
+
+export async function streamActivitySummary(
+    email: string,
+    date: string,
+    llmProvider: string,
+    onEvent: (event: SummaryStreamEvent) => void,
+): Promise<void> {
+    const response = await fetch(`${API_BASE_URL}/activity/summary/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ developer_email: email, date, llm_provider: llmProvider }),
+    });
+
+    if (!response.ok || !response.body) {
+        throw new Error('Failed to fetch activity summary');
+    }
+
+    // NDJSON: one event per line
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line) as SummaryStreamEvent;
+            if (event.event === 'error') {
+                throw new Error(event.detail);
+            }
+            onEvent(event);
+        }
+    }
+}
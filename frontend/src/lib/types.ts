@@ -17,4 +17,5 @@ export interface ActivitySummary {
     details: IssueDetail[];
     summary: string;
     status: string;
+    cached?: boolean;
 }
@@ -4,7 +4,8 @@
 echo "Starting Backend..."
 cd backend
 source venv/bin/activate
-pm2 start "python main.py" --name "backend"
+# gunicorn with uvicorn workers; WEB_CONCURRENCY in backend/.env sets the worker count
+pm2 start "gunicorn -c gunicorn.conf.py main:app" --name "backend"
 deactivate
 cd ..
 